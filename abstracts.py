@@ -33,6 +33,10 @@ class KernelBase:
         raise Exception("!!ERROR!! kernel class not implemented!!!")
     def clearPlot(self):
         raise Exception("!!ERROR!! kernel class not implemented!!!")
+    def stats(self):    # timing statistics of the measurements
+        raise Exception("!!ERROR!! kernel class not implemented!!!")
+    def showStats(self):
+        raise Exception("!!ERROR!! kernel class not implemented!!!")
 
 # Base classes for UI
 
@@ -63,6 +67,15 @@ class ExperimentBase:
     
     plotXYs = None
     
+    # Optional polling rates: {"group": (every, unit)}, unit = "ticks" or "s", e.g. {"lockins": (1, "ticks"), "temperatures": (10, "ticks"), "magnet": (1., "s")}
+    # If defined, the kernel calls measure_groups() with the groups due, instead of measure(); variables of the other groups keep their last values
+    # and the kernel sets the variable "age_<group>" (see kernels.RateGroups.age_variables), if the experiment has it, to the age of the group's values in s
+    rate_groups = None
+    
+    # True if the experiment locks each bus for its own reads (e.g. reading through a kernels.ReadGroup, or with devices.device_base.bus_lock)
+    # the kernel then does not hold the global instrument_lock over a whole measurement, so that traffic on other buses proceeds meanwhile
+    bus_locking = False
+    
     default_comments = ""
     
     def __init__(self):
@@ -74,6 +87,9 @@ class ExperimentBase:
     def measure(self):  # Trigger a measurement
         raise Exception("!!Galileo ERROR!! Measurement triggering method not implemented!!!")
         
+    def measure_groups(self, groups):  # Trigger a measurement of the rate groups named in "groups" only
+        raise Exception("!!Galileo ERROR!! Measurement of rate groups not implemented!!!")
+        
     def log(self, dataToLog):  # Write the data to storage; dataToLog is the data to log
         raise Exception("!!Galileo ERROR!! Data logging method not implemented!!!")
         
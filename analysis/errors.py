@@ -1,5 +1,7 @@
 ######################################################################################################
 # various methods for estimating errors
+# The estimators marked axis_aware take an axis argument, like numpy reductions,
+# so that datasets.downsample() can estimate the errors of all the samples at once
 ######################################################################################################
 
 import numpy as np
@@ -8,41 +10,49 @@ import numpy as np
 def fixed(error_value):
     def f(*args, **kwargs):
         return error_value
+    f.axis_aware = True
     return f
     
 
 # an estimator that gives standard deviation as error
-def std(values, errors):
+def std(values, errors, axis=None):
     """takes two numpy arrays: values and errors in these values
     estimate the grand standard deviation as error value
     not accurate for multiple rounds of averaging"""
-    var1 = np.nanvar(values, ddof=1)    # variance in the values
-    var2 = np.nanmean(np.square(errors)) # mean-square of input errors
+    var1 = np.nanvar(values, ddof=1, axis=axis)    # variance in the values
+    var2 = np.nanmean(np.square(errors), axis=axis) # mean-square of input errors
     return np.sqrt(var1 + var2)
+std.axis_aware = True
     
 # standard error of the mean
-def se(values, errors=None):
-    n = values.size
+def se(values, errors=None, axis=None):
+    n = values.size if axis is None else values.shape[axis]
     if n <= 1:
-        return float("nan")
+        return float("nan") if axis is None else np.full(np.delete(values.shape, axis), np.nan)
     else:
-        st = np.nanstd(values)
+        st = np.nanstd(values, axis=axis)
         se = st / np.sqrt(n-1)
         return se
+se.axis_aware = True
         
     
 # an estimator that gives median value of the input errors as error
-def median(values, errors):
+def median(values, errors, axis=None):
     """takes two numpy arrays: values and errors in these values
     estimate the grand standard deviation as error value
     not accurate for multiple rounds of averaging"""
-    return np.median(errors)
+    return np.median(errors, axis=axis)
+median.axis_aware = True
     
 # For small sample size, trust the error estimations of the samples, instead of re-calculation of population std
-def from_samples(values, errors):
-    n = np.count_nonzero(~np.isnan(errors))
-    if n < 1:
-        return float("nan")
-    else:
-        return np.sqrt(np.nansum(np.square(errors))) / n
+def from_samples(values, errors, axis=None):
+    n = np.count_nonzero(~np.isnan(errors), axis=axis)
+    if axis is None:
+        if n < 1:
+            return float("nan")
+        else:
+            return np.sqrt(np.nansum(np.square(errors))) / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(n < 1, np.nan, np.sqrt(np.nansum(np.square(errors), axis=axis)) / n)
+from_samples.axis_aware = True
     
\ No newline at end of file
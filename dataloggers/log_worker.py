@@ -0,0 +1,156 @@
+""" A long-lived data-logging thread, fed through a bounded queue
+    so that slow disk writes never hold up the measurements
+"""
+import time
+import threading
+import collections
+import pickle
+import tempfile
+import traceback
+
+# Constants
+DEFAULT_QUEUE_SIZE = 10000  # maximum number of data points waiting in memory
+BLOCK = "block"     # overflow policy: wait for the logger to catch up
+DROP_OLDEST = "drop_oldest"     # overflow policy: discard the oldest waiting data point
+SPILL = "spill"     # overflow policy: park the excess in a temporary file on disk, logged later in order
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+class LogWorker:
+    """Calls log(dataToLog) in a single worker thread, for every data point put() in the queue, in order"""
+    def __init__(self, log, maxsize=DEFAULT_QUEUE_SIZE, overflow=BLOCK, name="data-logging"):
+                # (self, the logging function, maximum queue length, overflow policy, thread name)
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("[LogWorker] unknown overflow policy: \"{}\"".format(overflow))
+        self.log = log
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.name = name
+
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.flag_finish = False
+        self.thread = None
+
+        # Spilling to disk
+        self.spill_file = None
+        self.spill_read = 0    # file position of the next spilled data point
+        self.spill_pending = 0  # number of spilled data points not yet logged
+
+        # Metrics
+        self.max_depth = 0
+        self.n_logged = 0
+        self.n_dropped = 0
+        self.n_spilled = 0
+        self.n_errors = 0
+        self.log_time_max = 0.     # in s
+        self.log_time_sum = 0.
+
+    def start(self):
+        self.flag_finish = False
+        self.thread = threading.Thread(target=self.work, name=self.name)
+        self.thread.start()
+
+    def put(self, dataToLog):
+        with self.condition:
+            if self.spill_pending > 0:
+                # keep the order: everything goes behind what has already been spilled
+                self.spill(dataToLog)
+                return
+            if len(self.queue) >= self.maxsize:
+                if self.overflow == BLOCK:
+                    while len(self.queue) >= self.maxsize:
+                        self.condition.wait()
+                elif self.overflow == DROP_OLDEST:
+                    self.queue.popleft()
+                    self.n_dropped += 1
+                else:
+                    self.spill(dataToLog)
+                    return
+            self.queue.append(dataToLog)
+            if len(self.queue) > self.max_depth:
+                self.max_depth = len(self.queue)
+            self.condition.notify_all()
+
+    # Append a data point to the spill file, the condition must be held
+    def spill(self, dataToLog):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="elflab_spill_")
+        self.spill_file.seek(0, 2)
+        pickle.dump(dataToLog, self.spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spill_pending += 1
+        self.n_spilled += 1
+        self.condition.notify_all()
+
+    # Take back the oldest spilled data point, the condition must be held
+    def unspill(self):
+        self.spill_file.seek(self.spill_read)
+        dataToLog = pickle.load(self.spill_file)
+        self.spill_pending -= 1
+        if self.spill_pending == 0:     # all caught up, recycle the file
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+            self.spill_read = 0
+        else:
+            self.spill_read = self.spill_file.tell()
+        return dataToLog
+
+    def work(self):
+        while True:
+            with self.condition:
+                while (len(self.queue) == 0) and (self.spill_pending == 0) and not self.flag_finish:
+                    self.condition.wait()
+                if len(self.queue) > 0:
+                    dataToLog = self.queue.popleft()
+                elif self.spill_pending > 0:
+                    dataToLog = self.unspill()
+                else:   # finishing, and nothing is left
+                    break
+                self.condition.notify_all()
+
+            t = time.perf_counter()
+            try:
+                self.log(dataToLog)
+            except Exception:
+                self.n_errors += 1
+                print("    [LogWorker:] WARNING: data logging failed:\n{}".format(traceback.format_exc()))
+            t = time.perf_counter() - t
+            self.n_logged += 1
+            self.log_time_sum += t
+            if t > self.log_time_max:
+                self.log_time_max = t
+
+    def finish(self):
+        """log everything still waiting, then stop the worker"""
+        with self.condition:
+            self.flag_finish = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def full(self):     # True if put() would overflow the queue in memory
+        with self.condition:
+            return len(self.queue) >= self.maxsize
+
+    def depth(self):    # number of data points waiting, in memory and on disk
+        with self.condition:
+            return len(self.queue) + self.spill_pending
+
+    def metrics(self):
+        with self.condition:
+            return {"depth": len(self.queue),
+                    "spill_depth": self.spill_pending,
+                    "max_depth": self.max_depth,
+                    "logged": self.n_logged,
+                    "dropped": self.n_dropped,
+                    "spilled": self.n_spilled,
+                    "errors": self.n_errors,
+                    "log_time_mean": self.log_time_sum / self.n_logged if self.n_logged > 0 else float("nan"),
+                    "log_time_max": self.log_time_max
+                    }
+
+    def report(self):
+        m = self.metrics()
+        return "{logged:d} data points logged, queue depth {depth:d} (max {max_depth:d}), {spilled:d} spilled to disk, {dropped:d} dropped, {errors:d} errors; log time: mean={log_time_mean:.3g} s, max={log_time_max:.3g} s".format(**m)
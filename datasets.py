@@ -2,12 +2,31 @@
 # Defines the DataSet class and various creation / manipulation methods
 ######################################################################################################
 import csv
+import gzip
+import itertools
+import json
+import os
+import re
+import warnings
 
 import elflab.abstracts as abstracts
 
 import scipy.interpolate as interpolate
 import numpy as np
 
+# Constants
+CHUNK_ROWS = 100000     # lines parsed or written at a time by load_csv and save_csv
+DEFAULT_FORMAT = "{:.10g}"
+GZIP_LEVEL = 1  # fastest: numerical text compresses nearly as well as at level 9, in a fraction of the time
+SAFE_CHARACTERS = "0123456789.+-eEfFgGinaINA %"   # characters of formatted numbers, not to be used as delimiters by the fast writer
+_FORMAT_FIELD = re.compile(r"^([^{}]*)\{[^{}:!]*:([^{}]*)\}([^{}]*)$")  # literal text, one field {:spec}, literal text
+_FORMAT_SPEC = re.compile(r"^([<>])?([-+ ])?(#)?(0)?(\d+)?(\.\d+)?([eEfFgG])$")  # the specs printf formats identically
+AXIS_REDUCTIONS = {np.mean, np.nanmean, np.median, np.nanmedian, np.min, np.nanmin, np.max, np.nanmax,
+                   np.std, np.nanstd, np.var, np.nanvar, np.sum, np.nansum, np.ptp}   # down-sampling methods taking an axis argument
+BINARY_FORMAT = "elflab.DataSet"   # binary format, written by save_binary
+BINARY_VERSION = 1
+BINARY_META = "dataset.json"    # metadata file of the binary format
+
 class DataSet(abstracts.DataSetBase):
     def __init__(self, *args, **kwargs):
         super(DataSet, self).__init__(*args, **kwargs)
@@ -104,8 +123,254 @@ class DataSet(abstracts.DataSetBase):
         return newset
     
         
-def load_csv(filepath, column_mapping, error_column=0, has_header=True, use_header=True, **csv_params):
-    """read data from a csv file, assuming no error values are recorded
+
+# ____Out-of-core datasets: columns memory-mapped from the disk, and views through row indices instead of copies
+class IndexedColumns(dict):
+    """{key: column} giving the rows "indices" of the columns stored (all the rows if indices is None)
+    A column is gathered on its first access, through any of the read paths, then kept until update()"""
+    indices = None
+    gathered = None     # {key: column gathered}
+    def __init__(self, columns, indices=None):
+        super(IndexedColumns, self).__init__(columns)
+        self.indices = indices
+        self.gathered = {}
+    
+    def __getitem__(self, key):
+        if self.indices is None:
+            return dict.__getitem__(self, key)
+        if key not in self.gathered:
+            self.gathered[key] = dict.__getitem__(self, key)[self.indices]
+        return self.gathered[key]
+    
+    def __setitem__(self, key, column):
+        if self.indices is not None:    # the column would be stored as the rows of the view, then gathered again
+            raise ValueError("[elflab.IndexedColumns] cannot set \"{}\" on a view (sorted or masked): set it on the full set, or on a copy in memory".format(key))
+        self.gathered.pop(key, None)
+        dict.__setitem__(self, key, column)
+    
+    # The other read paths go through __getitem__, not the columns stored;
+    # overriding __iter__ also keeps dict(columns) and {**columns} from reading the storage directly
+    def __iter__(self):
+        return dict.__iter__(self)
+    
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+    
+    def items(self):
+        return [(key, self[key]) for key in self]
+    
+    def values(self):
+        return [self[key] for key in self]
+    
+    def copy(self):
+        return {key: self[key] for key in self}
+    
+    def base(self, key):    # the column as stored
+        return dict.__getitem__(self, key)
+    
+    def rows(self, key, start, stop):   # the rows start to stop of the column, without gathering the others
+        column = dict.__getitem__(self, key)
+        if self.indices is None:
+            return column[start:stop]
+        return column[self.indices[start:stop]]
+
+
+class MappedDataSet(DataSet):
+    """A DataSet of memory-mapped columns (see load_binary), for datasets larger than the memory
+    sort() and mask() return views: an index array into the same columns, whose entries are gathered on first access
+    and kept, one column at a time, so only the columns used are read; downsample() and chunks() go through the rows chunk by chunk
+    The columns are read-only, and no column can be added to a view: in_memory() gives an ordinary DataSet to modify"""
+    indices = None  # rows of the mapped columns in the view, None for all the rows in order
+    gathered = None     # {key: column gathered}
+    def __init__(self, columns, errors=None, indices=None, titles=None):
+        self.gathered = {}
+        super(MappedDataSet, self).__init__(columns)
+        self.indices = indices
+        if errors is not None:
+            self.errors = IndexedColumns(errors, indices)
+        if titles is not None:
+            self.titles = titles.copy()
+        self.update()
+    
+    __getitem__ = IndexedColumns.__getitem__
+    __setitem__ = IndexedColumns.__setitem__
+    __iter__ = IndexedColumns.__iter__
+    get = IndexedColumns.get
+    items = IndexedColumns.items
+    values = IndexedColumns.values
+    copy = IndexedColumns.copy
+    base = IndexedColumns.base
+    rows = IndexedColumns.rows
+    
+    # Update the fields after data change, without gathering any column
+    def update(self):
+        self.sorted_views = {}
+        self.gathered = {}
+        if self.errors is not None:
+            self.errors.gathered = {}
+        lengths = set(self.base(key).shape[0] for key in self)
+        if self.errors is not None:
+            lengths |= set(self.errors.base(key).shape[0] for key in self)
+        if len(lengths) > 1:
+            raise IndexError("[elflab.MappedDataSet.update] lengths of entries do not match")
+        if self.indices is not None:
+            self.length = self.indices.shape[0]
+        elif len(lengths) > 0:
+            self.length = lengths.pop()
+        else:
+            self.length = 0
+        for key in self:
+            if key not in self.titles:
+                self.titles[key] = key
+    
+    # a view of the rows "indices" of this set
+    def view(self, indices):
+        if self.indices is not None:
+            indices = self.indices[indices]
+        errors = None
+        if self.errors is not None:
+            errors = {key: self.errors.base(key) for key in self}
+        return MappedDataSet([(key, self.base(key)) for key in self], errors, indices, self.titles)
+    
+    # the columns are read-only, so a view serves as a copy
+    def duplicate(self):
+        return self.mask(slice(None))
+    
+    # return a sorted view
+    def sort(self, key):
+        if key in self.sorted_views:
+            sorted = self.sorted_views[key]
+        else:
+            sorted = self.view(np.argsort(self[key], kind='quicksort'))
+            self.sorted_views[key] = sorted
+            sorted.sorted_views = self.sorted_views
+            sorted.titles = self.titles
+        return sorted
+    
+    # return a masked view of self by using numpy indexing
+    def mask(self, indices):
+        if isinstance(indices, slice):
+            if self.indices is None:    # a slice of memory-mapped columns is still mapped
+                errors = None
+                if self.errors is not None:
+                    errors = {key: self.errors.base(key)[indices] for key in self}
+                return MappedDataSet([(key, self.base(key)[indices]) for key in self], errors, None, self.titles)
+            return self.view(indices)
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return self.view(indices)
+    
+    # the rows start to stop, as an ordinary DataSet in memory
+    def chunk(self, start, stop):
+        newset = DataSet([(key, np.array(self.rows(key, start, stop), dtype=float)) for key in self])
+        if self.errors is not None:
+            newset.errors = {key: np.array(self.errors.rows(key, start, stop), dtype=float) for key in self}
+        newset.titles = self.titles.copy()
+        return newset
+    
+    def chunks(self, chunk_rows=CHUNK_ROWS):
+        """iterate through the rows chunk_rows at a time, yielding (start, stop, chunk as a DataSet in memory)"""
+        for start in range(0, self.length, chunk_rows):
+            stop = min(start + chunk_rows, self.length)
+            yield (start, stop, self.chunk(start, stop))
+    
+    def in_memory(self):
+        return self.chunk(0, self.length)
+    
+    def downsample(self, size, method=np.nanmean, error_est=None, chunk_rows=CHUNK_ROWS):
+        """downsample() chunk by chunk, each chunk holding whole samples, the last one taking the remaining rows"""
+        n_samples = self.length // size
+        samples_per_chunk = max(chunk_rows // size, 1)
+        if n_samples <= samples_per_chunk:
+            return downsample(self.in_memory(), size, method, error_est)
+        parts = []
+        for first in range(0, n_samples, samples_per_chunk):
+            start = first * size
+            stop = (first + samples_per_chunk) * size if first + samples_per_chunk < n_samples else self.length
+            parts.append(downsample(self.chunk(start, stop), size, method, error_est))
+        newset = DataSet([(key, np.concatenate([part[key] for part in parts])) for key in self])
+        if error_est is not None:
+            newset.errors = {key: np.concatenate([part.errors[key] for part in parts]) for key in self}
+        newset.titles = self.titles.copy()
+        return newset
+    
+def load_csv(filepath, column_mapping, error_column=0, has_header=True, use_header=True, chunk_rows=CHUNK_ROWS, **csv_params):
+    """read data from a csv file (gzipped if the name ends with ".gz"), assuming no error values are recorded
+    column_mapping = {column_index1: variable_name1, ...}, has to be specified by user for all columns to read
+    If use_header == True, then the headers will be read as the full titles of the variables
+    error_column > 0 if the file contains error information on the values, and stored starting at error_column in the same order of value columns.
+    The file is parsed chunk_rows lines at a time, each chunk by numpy in one go; a chunk that numpy cannot parse
+    (unparsable cells, rows too short, quotes...) is parsed row by row, with NaN for unparsable cells"""
+    keys = [column_mapping[i] for i in column_mapping]
+    indices = [i for i in column_mapping]
+    if error_column > 0:
+        indices += [i + error_column for i in column_mapping]
+    delimiter = csv_params.get("delimiter", ",")
+    # numpy parses plain delimited text only, other csv dialects are parsed row by row
+    fast = (set(csv_params.keys()) <= {"delimiter"}) and (len(delimiter) == 1)
+    
+    chunks = []
+    with _open_text(filepath, "r") as f:
+        # Read the header row if applicable
+        titles = {key: key for key in keys}
+        if has_header:
+            line = f.readline()
+            if use_header:
+                row = next(csv.reader([line], **csv_params))
+                titles = {column_mapping[i]: row[i] for i in column_mapping}
+        # now read the data
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if len(lines) == 0:
+                break
+            block = None
+            if fast:
+                try:
+                    with warnings.catch_warnings():     # a chunk of blank lines is no news
+                        warnings.simplefilter("ignore", UserWarning)
+                        block = np.loadtxt(lines, dtype=float, delimiter=delimiter, usecols=indices, ndmin=2, comments=None)
+                except (ValueError, IndexError):
+                    pass
+            if block is None:
+                block = _parse_rows(csv.reader(lines, **csv_params), indices)
+            chunks.append(block)
+    
+    if len(chunks) > 0:
+        data = np.concatenate(chunks, axis=0)
+    else:
+        data = np.empty((0, len(indices)), dtype=float)
+    
+    # Convert data to the dataset format
+    n = len(keys)
+    data_set = DataSet([(key, np.ascontiguousarray(data[:, j])) for (j, key) in enumerate(keys)])
+    data_set.titles = titles
+    if error_column > 0:
+        data_set.errors = {key: np.ascontiguousarray(data[:, n + j]) for (j, key) in enumerate(keys)}
+    return data_set
+
+def _parse_rows(reader, indices):
+    # parse the columns "indices" of the rows one by one, NaN for unparsable cells, skipping rows too short
+    n_needed = max(indices) + 1
+    values = []
+    for row in reader:
+        if len(row) >= n_needed:
+            try:
+                values.append([float(row[i]) for i in indices])
+            except ValueError:
+                values.append([_to_float(row[i]) for i in indices])
+        elif len(row) > 0:
+            print ("WARNING: Too few columns read, skipping row.")
+    return np.array(values, dtype=float).reshape((len(values), len(indices)))
+
+def _to_float(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        return np.nan
+
+def load_csv_legacy(filepath, column_mapping, error_column=0, has_header=True, use_header=True, **csv_params):
+    """read data from a csv file row by row (the original implementation of load_csv, kept for reference and benchmarking)
     column_mapping = {column_index1: variable_name1, ...}, has to be specified by user for all columns to read
     If use_header == True, then the headers will be read as the full titles of the variables
     error_column > 0 if the file contains error information on the values, and stored starting at error_column in the same order of value columns."""              
@@ -152,9 +417,75 @@ def load_csv(filepath, column_mapping, error_column=0, has_header=True, use_head
         data_set.errors = {key: np.array(error_lists[key], dtype=np.float) for key in data_lists}
     return data_set
     
-def save_csv(dataset, filepath, columns=None, format_string="{:.10g}", write_header=True, **csv_params):
+def save_csv(dataset, filepath, columns=None, format_string=DEFAULT_FORMAT, write_header=True, chunk_rows=CHUNK_ROWS, compress=None, **csv_params):
     """write data to a csv file
     columns: a list of variables to write, write all variables if None
+    format_string: one format for all the variables, or {variable: format} (DEFAULT_FORMAT for the others), errors taking the format of their variables
+    compress: gzip the file, by default if filepath ends with ".gz"
+    The data are formatted chunk_rows rows at a time, by one printf-style operation if the formats allow it"""
+    if columns is None:
+        columns = [key for key in dataset]
+    N = len(columns)
+    
+    if isinstance(format_string, dict):
+        formats = [format_string.get(key, DEFAULT_FORMAT) for key in columns]
+    else:
+        formats = [format_string for key in columns]
+    arrays = [dataset[key] for key in columns]
+    header = list(columns)
+    if dataset.errors is not None:
+        formats += formats
+        arrays += [dataset.errors[key] for key in columns]
+        header += ["error({})".format(key) for key in columns]
+    
+    # one printf-style format for a whole row, if every format has an equivalent and csv would not quote anything
+    delimiter = csv_params.get("delimiter", ",")
+    terminator = csv_params.get("lineterminator", "\r\n")
+    percent = [_percent_format(fmt) for fmt in formats]
+    fast = (set(csv_params.keys()) <= {"delimiter", "lineterminator"}) and (None not in percent) \
+        and (len(delimiter) == 1) and (delimiter not in SAFE_CHARACTERS) and all(delimiter not in fmt and '"' not in fmt for fmt in formats)
+    if fast:
+        row_format = delimiter.join(percent) + terminator
+    
+    with _open_text(filepath, "w", compress) as f:
+        writer = csv.writer(f, **csv_params)
+        # write header line
+        if write_header:
+            writer.writerow(header)
+        # write data lines
+        for start in range(0, max(dataset.length, 0), chunk_rows):
+            stop = min(start + chunk_rows, dataset.length)
+            if fast:
+                block = np.column_stack([a[start:stop] for a in arrays])
+                f.write((row_format * (stop - start)) % tuple(block.ravel().tolist()))
+            else:
+                writer.writerows([fmt.format(v) for (fmt, v) in zip(formats, row)] for row in zip(*(a[start:stop].tolist() for a in arrays)))
+
+def _percent_format(format_string):
+    """the printf-style equivalent of a format string holding one numerical field, e.g. "{:.10g} K" -> "%.10g K"
+    None if there is no exact equivalent"""
+    match = _FORMAT_FIELD.match(format_string)
+    if match is None:
+        return None
+    (prefix, spec, suffix) = match.groups()
+    match = _FORMAT_SPEC.match(spec)
+    if match is None:
+        return None
+    (align, sign, alternate, zero, width, precision, type) = match.groups()
+    flags = ("-" if align == "<" else "") + (sign if sign in ("+", " ") else "") + (alternate or "") + (zero or "")
+    return "{}%{}{}{}{}{}".format(prefix.replace("%", "%%"), flags, width or "", precision or "", type, suffix.replace("%", "%%"))
+
+def _open_text(filepath, mode, compress=None):
+    # a text file for csv, gzipped if compress, or by default if the name ends with ".gz"
+    if compress is None:
+        compress = str(filepath).endswith(".gz")
+    if compress:
+        return gzip.open(filepath, mode + "t", compresslevel=GZIP_LEVEL, newline='')
+    return open(filepath, mode, newline='')
+    
+def save_csv_legacy(dataset, filepath, columns=None, format_string="{:.10g}", write_header=True, **csv_params):
+    """write data to a csv file cell by cell (the original implementation of save_csv, kept for reference and benchmarking)
+    columns: a list of variables to write, write all variables if None
     header is the header row in list format, including the errors"""
     
     if columns is None:
@@ -191,6 +522,56 @@ def save_csv(dataset, filepath, columns=None, format_string="{:.10g}", write_hea
                     row[j+N] = format_string.format(dataset.errors[key][i])
             writer.writerow(row)
     
+def save_binary(dataset, path, columns=None):
+    """write the dataset as a directory of binary columns: one contiguous float64 .npy file per variable (and per error),
+    and a JSON file of metadata (variables in order, titles, length)
+    columns: a list of variables to write, write all variables if None"""
+    if columns is None:
+        columns = [key for key in dataset]
+    os.makedirs(path, exist_ok=True)
+    meta = {"format": BINARY_FORMAT, "version": BINARY_VERSION,
+            "length": max(dataset.length, 0), "keys": list(columns),
+            "titles": {key: dataset.titles.get(key, key) for key in columns} if dataset.titles is not None else {key: key for key in columns},
+            "columns": {}, "errors": None}
+    # files are named by index, as variable names need not be valid file names
+    for (i, key) in enumerate(columns):
+        meta["columns"][key] = "{:d}.npy".format(i)
+        np.save(os.path.join(path, meta["columns"][key]), np.ascontiguousarray(dataset[key], dtype=float))
+    if dataset.errors is not None:
+        meta["errors"] = {}
+        for (i, key) in enumerate(columns):
+            meta["errors"][key] = "{:d}.error.npy".format(i)
+            np.save(os.path.join(path, meta["errors"][key]), np.ascontiguousarray(dataset.errors[key], dtype=float))
+    # the metadata last: a directory without it is an incomplete write
+    with open(os.path.join(path, BINARY_META), "w") as f:
+        json.dump(meta, f, indent=1)
+    
+def load_binary(path, columns=None, mmap_mode="r"):
+    """read a dataset written by save_binary
+    columns: a list of variables to read, read all variables if None
+    mmap_mode: the columns are memory-mapped (see numpy.load) into a MappedDataSet, so that only the parts used are read from the disk
+        None to read them into an ordinary DataSet in memory"""
+    with open(os.path.join(path, BINARY_META), "r") as f:
+        meta = json.load(f)
+    if meta.get("format", None) != BINARY_FORMAT:
+        raise ValueError("[elflab.datasets.load_binary] \"{}\" is not a DataSet directory".format(path))
+    if meta["version"] > BINARY_VERSION:
+        raise ValueError("[elflab.datasets.load_binary] format version {} not supported".format(meta["version"]))
+    if columns is None:
+        columns = meta["keys"]
+    data = [(key, np.load(os.path.join(path, meta["columns"][key]), mmap_mode=mmap_mode)) for key in columns]
+    errors = None
+    if meta["errors"] is not None:
+        errors = {key: np.load(os.path.join(path, meta["errors"][key]), mmap_mode=mmap_mode) for key in columns}
+    titles = {key: meta["titles"][key] for key in columns}
+    if mmap_mode is not None:
+        return MappedDataSet(data, errors, None, titles)
+    data_set = DataSet(data)
+    data_set.errors = errors
+    data_set.titles = titles
+    data_set.update()
+    return data_set
+    
 # Merge two datasets, currently errors are ignored
 def merge(dataset1, dataset2):
     # Firstly check whether keys match
@@ -204,9 +585,12 @@ def merge(dataset1, dataset2):
     
 def downsample(dataset, size, method=np.nanmean, error_est=None):
     """Down sampling the dataset by a sampling function "method"
-    size is the number of data points per sample
+    size is the number of data points per sample, the last sample taking the remaining points
     new errors are estimated with the function "error_est"
+    numpy reductions and the analysis.errors estimators process all the samples at once, other functions one sample at a time
     return the down-sampled dataset"""
+    if isinstance(dataset, MappedDataSet):
+        return dataset.downsample(size, method, error_est)
     # If the old set has errors undefined, set all errors as zero
     if (error_est is not None) and (dataset.errors is None):
         dataset.errors = {key:np.zeros((dataset.length,), dtype=np.float) for key in dataset}
@@ -218,17 +602,32 @@ def downsample(dataset, size, method=np.nanmean, error_est=None):
     else:
         newset.errors = {key: np.empty((new_length,), dtype=np.float) for key in dataset}
     
-    # calculate the values in the new set
+    # calculate the values in the new set: the full samples all at once if possible, then the last one, which takes the remainder
+    m = (new_length-1)*size
     for key in dataset:
-        for i in range(new_length-1):
-            newset[key][i] = method(dataset[key][i*size:(i+1)*size])
-            if error_est is not None:
-                newset.errors[key][i] = error_est(dataset[key][i*size:(i+1)*size], dataset.errors[key][i*size:(i+1)*size])
-        newset[key][new_length-1] = method(dataset[key][(new_length-1)*size:dataset.length])
+        if new_length < 1:
+            break
+        values = dataset[key]
+        newset[key][:new_length-1] = _reduce_samples(method, size, values[:m])
+        newset[key][new_length-1] = method(values[m:dataset.length])
         if error_est is not None:
-            newset.errors[key][new_length-1] = error_est(dataset[key][(new_length-1)*size:dataset.length], dataset.errors[key][(new_length-1)*size:dataset.length])
+            errors = dataset.errors[key]
+            newset.errors[key][:new_length-1] = _reduce_samples(error_est, size, values[:m], errors[:m])
+            newset.errors[key][new_length-1] = error_est(values[m:dataset.length], errors[m:dataset.length])
     return newset
 
+def _reduce_samples(function, size, *columns):
+    """function of each sample of "size" rows of the columns, whose lengths are multiples of size
+    by one call along axis 1 of the columns reshaped into (samples, size) if function takes an axis argument
+    (AXIS_REDUCTIONS, or marked axis_aware, like the analysis.errors estimators), otherwise one call per sample"""
+    n = columns[0].shape[0] // size
+    try:
+        axis_aware = (function in AXIS_REDUCTIONS) or getattr(function, "axis_aware", False)
+    except TypeError:   # unhashable callable
+        axis_aware = getattr(function, "axis_aware", False)
+    if axis_aware:
+        return function(*(c.reshape((n, size)) for c in columns), axis=1)
+    return [function(*(c[i*size:(i+1)*size] for c in columns)) for i in range(n)]
 
     
 def consolidate(dataset, key, window_size, method, error_est=None):
@@ -239,6 +638,8 @@ def consolidate(dataset, key, window_size, method, error_est=None):
     
     # sort the dataset
     sorted = dataset.sort(key)
+    if isinstance(sorted, MappedDataSet):   # sliced window by window below: gather the columns once
+        sorted = sorted.in_memory()
     
     # If the old set has errors undefined, set all errors as zero
     if (sorted.errors is None) and (error_est is not None):
@@ -1,11 +1,49 @@
 """ Thermometer base """
+import time
 
 class TControllerBase:
+    channels = ()   # all input channels, for read_all()
+    
     # Default read function, returns (t, T) of the specified channel
     def connect(self):     
         raise Exception("temperature controller not implemented")
     def read(self, ch):     
         raise Exception("temperature controller not implemented")
+    
+    # Returns (t, [T, ...]) of the specified channels, in order
+    # this default reads the channels one by one; controllers with a multi-channel query do it in one transaction
+    def read_many(self, channels):
+        if len(channels) == 0:
+            raise ValueError("[{}] no channel to read".format(type(self).__name__))
+        Ts = []
+        for ch in channels:
+            reading = self.read(ch)
+            t = reading[0]
+            Ts.append(reading[1])
+        return (t, Ts)
+    
+    # read_many() of the controllers answering a compound query in one response:
+    # the per-channel query_template (e.g. "KRDG? {}") for each channel, joined by separator, which also separates the readings
+    def query_many(self, channels, query_template, separator=";"):
+        if len(channels) == 0:
+            raise ValueError("[{}] no channel to read".format(type(self).__name__))
+        if not self.connected:
+            self.connect()
+        reading = self.gpib.query(separator.join(query_template.format(ch) for ch in channels))
+        t = time.perf_counter()
+        values = reading.strip().split(separator)
+        if len(values) != len(channels):
+            raise Exception("{}: {:d} readings returned for {:d} channels".format(type(self).__name__, len(values), len(channels)))
+        Ts = []
+        for v in values:
+            try:
+                Ts.append(float(v))
+            except ValueError:
+                Ts.append(float("nan"))
+        return (t, Ts)
+    
+    def read_all(self):     # returns (t, [T, ...]) of all channels
+        return self.read_many(self.channels)
         
         
 
@@ -1,16 +1,16 @@
 import time
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource
 from elflab.devices.T_controllers.T_controller_base import TControllerBase
 
 class Cryocon32B(TControllerBase):  
+    channels = ("A", "B")
     def __init__(self, address):
         self.address = address
         
         self.connected = False
     
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.get_instrument("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         idn = self.gpib.query("*idn?")
         if not ("Cryocon Model 32" in idn):
             raise Exception("Cryocon Model 32 temperature controller idn string does not match")
@@ -27,4 +27,7 @@ class Cryocon32B(TControllerBase):
             T = float(reading)
         except ValueError:
             T = float("nan")
-        return (t, T)
\ No newline at end of file
+        return (t, T)
+    
+    def read_many(self, channels):     # return (t, [T, ...]) for the specified channels, from one compound query
+        return self.query_many(channels, "INPUT? {}")
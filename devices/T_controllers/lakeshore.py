@@ -1,16 +1,16 @@
 import time
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource
 from elflab.devices.T_controllers.T_controller_base import TControllerBase
 
 class Lakeshore332(TControllerBase):  
+    channels = ("A", "B")
     def __init__(self, address):
         self.address = address
         
         self.connected = False
     
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         idn = self.gpib.query("*idn?")
         if not ("LSCI,MODEL332S" in idn):
             raise Exception("Lakeshore Model 332 temperature controller idn string does not match")
@@ -28,16 +28,19 @@ class Lakeshore332(TControllerBase):
         except ValueError:
             T = float("nan")
         return (t, T)
+    
+    def read_many(self, channels):     # return (t, [T, ...]) for the specified channels, from one compound query
+        return self.query_many(channels, "KRDG? {}")
         
 class Lakeshore340(TControllerBase):  
+    channels = ("A", "B", "C", "D")
     def __init__(self, address):
         self.address = address
         
         self.connected = False
     
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         idn = self.gpib.query("*idn?")
         if not ("LSCI,MODEL340" in idn):
             raise Exception("Lakeshore Model 340 temperature controller idn string does not match")
@@ -55,6 +58,9 @@ class Lakeshore340(TControllerBase):
         except ValueError:
             T = float("nan")
         return (t, T)
+    
+    def read_many(self, channels):     # return (t, [T, ...]) for the specified channels, from one compound query
+        return self.query_many(channels, "KRDG? {}")
         
     def set_setp(self, loop, T):   # change the set point of a loop
         if not self.connected:
@@ -31,20 +31,33 @@ class LeidenTC(TControllerBase):
         pass
     
     def read(self, ch):     # return (t, T, R) for the specified channel
+        t, Ts, Rs = self.read_many_TR((ch,))
+        return (t, Ts[0], Rs[0])
+    
+    def read_many(self, channels):    # return (t, [T, ...]) for the specified channels
+        t, Ts, Rs = self.read_many_TR(channels)
+        return (t, Ts)
+    
+    def read_many_TR(self, channels):   # return (t, [T, ...], [R, ...]) for the specified channels, attaching to the VI once
         pythoncom.CoInitialize()
         TC = LVApp("DRTempControl.Application", self.address)
-        reading = TC.GetData("T{}".format(ch))
-        try:
-            T = float(reading) / 1.e3
-        except ValueError:
-            T = float("nan")
-        reading = TC.GetData("R{}".format(ch))
-        try:
-            R = float(reading)
-        except ValueError:
-            R = float("nan")
+        Ts = []
+        Rs = []
+        for ch in channels:
+            reading = TC.GetData("T{}".format(ch))
+            try:
+                T = float(reading) / 1.e3
+            except ValueError:
+                T = float("nan")
+            reading = TC.GetData("R{}".format(ch))
+            try:
+                R = float(reading)
+            except ValueError:
+                R = float("nan")
+            Ts.append(T)
+            Rs.append(R)
         t = time.perf_counter()
-        return (t, T, R)
+        return (t, Ts, Rs)
         
         
 
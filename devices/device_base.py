@@ -1,4 +1,275 @@
+import threading
+import time
+import math
+
+LOCAL_INTERFACE = "local"     # interface key for simulated / address-less devices
+DEFAULT_GPIB_BOARD = "GPIB0"    # board assumed for bare integer GPIB addresses
+
+# Retries of failed queries
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BUDGET = 0.5  # in s, for all the queries of one read
+DEFAULT_BACKOFF = 0.01  # first wait between attempts, in s, then multiplied by the factor each time
+DEFAULT_BACKOFF_FACTOR = 2.
+DEFAULT_MAX_BACKOFF = 0.1
+DEFAULT_COOLDOWN = 5.   # in s, after the retries are exhausted, fail at once for this long instead of waiting for a dead instrument again
+
 class DeviceBase:
     has_gui = False
     def read():
-        raise Exception("device not implemented.")
\ No newline at end of file
+        raise Exception("device not implemented.")
+
+# ____Bounded retries of instrument queries, so that a flaky instrument cannot stall the measurement loop
+class RetryExhausted(Exception):
+    pass
+
+
+class RetryPolicy:
+    """Retry a query up to max_attempts times, waiting backoff (growing by factor up to max_backoff) in between,
+    without starting an attempt past the deadline (by default, budget seconds from the first attempt)
+    Given the VISA session, the timeout of each attempt is cut to the time left, so that the budget bounds the whole call;
+    otherwise an attempt started in time may still run for the full timeout of the session
+    Once the retries are exhausted, calls fail at once for cooldown seconds (a dead instrument costs the budget once per cool-down,
+    not on every read), so each device needs a policy of its own
+        usage:  deadline = policy.deadline()    # shared by the queries of one read
+                H = policy.call(query, "R7", deadline=deadline, session=self.gpib)
+    """
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, budget=DEFAULT_RETRY_BUDGET, backoff=DEFAULT_BACKOFF,
+                 factor=DEFAULT_BACKOFF_FACTOR, max_backoff=DEFAULT_MAX_BACKOFF, cooldown=DEFAULT_COOLDOWN):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.cooldown = cooldown
+        self.down_until = float("-inf")     # perf_counter() until which calls fail at once
+
+    def deadline(self):
+        return time.perf_counter() + self.budget
+
+    def call(self, function, *args, check=None, deadline=None, session=None):
+        """returns function(*args), the first value not raising an exception and passing check(value) if given
+        raises RetryExhausted when out of attempts or time, or cooling down after that"""
+        if time.perf_counter() < self.down_until:
+            raise RetryExhausted("cooling down after a failure, {:.3g} s left".format(self.down_until - time.perf_counter()))
+        if deadline is None:
+            deadline = self.deadline()
+        delay = self.backoff
+        attempt = 0
+        error = None
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0.:     # e.g. the earlier queries of the read used up the budget
+                raise self.exhausted("out of time after {:d} attempt(s), last error: {}".format(attempt, error)) from error
+            attempt += 1
+            try:
+                value = self.attempt(function, args, session, remaining)
+            except Exception as err:
+                error = err
+            else:
+                if (check is None) or check(value):
+                    return value
+                error = ValueError("invalid response {!r}".format(value))
+            if (attempt >= self.max_attempts) or (time.perf_counter() + delay > deadline):
+                raise self.exhausted("{:d} attempt(s) failed, last error: {}".format(attempt, error)) from error
+            time.sleep(delay)
+            delay = min(delay * self.factor, self.max_backoff)
+
+    def exhausted(self, message):   # start the cool-down, returns the exception to raise
+        self.down_until = time.perf_counter() + self.cooldown
+        return RetryExhausted(message)
+
+    def attempt(self, function, args, session, remaining):  # function(*args), with the session timeout cut to the time remaining
+        if session is None:
+            return function(*args)
+        timeout = session.timeout   # in ms, None for no timeout
+        capped = max(int(math.ceil(remaining * 1000.)), 1)
+        session.timeout = capped if timeout is None else min(timeout, capped)
+        try:
+            return function(*args)
+        finally:
+            session.timeout = timeout
+
+
+# Work out which physical interface (GPIB board, serial port, USB link, LabVIEW VI...) a device talks through
+def interface_of(device):
+    """returns a hashable key naming the interface of the device, derived from its address
+    devices reading through another device (e.g. a PAR 124A through a DMM) inherit its interface"""
+    for attr in ("dmm", "lockin"):
+        if hasattr(device, attr):
+            return interface_of(getattr(device, attr))
+    address = getattr(device, "address", None)
+    if address is None:
+        return LOCAL_INTERFACE
+    if isinstance(address, int):    # bare GPIB primary address
+        return DEFAULT_GPIB_BOARD
+    fields = str(address).split("::")
+    head = fields[0].upper()
+    if head == "GPIB":
+        return DEFAULT_GPIB_BOARD
+    elif head.startswith("GPIB") or head.startswith("ASRL") or head.startswith("COM"):
+        return head
+    elif (head.startswith("USB") or head.startswith("TCPIP")) and len(fields) > 2:
+        # every USB / network instrument is a link of its own
+        if fields[-1].upper() in ("INSTR", "RAW", "SOCKET"):
+            fields = fields[:-1]
+        return "::".join(fields)
+    else:
+        return address
+
+# ____Locks per physical interface, so that traffic on independent buses proceeds in parallel
+class BusLocks:
+    """One re-entrant lock per interface (as named by interface_of), created on first use
+    all() gives a lock over every bus, for code written for a single global instrument lock"""
+    def __init__(self):
+        self.locks = {}     # = {interface: RLock}
+        self.registry = threading.RLock()   # guards the dict only, never held while waiting for a bus
+
+    def get(self, device_or_interface):
+        if isinstance(device_or_interface, str):
+            interface = device_or_interface
+        else:
+            interface = interface_of(device_or_interface)
+        with self.registry:
+            if interface not in self.locks:
+                self.locks[interface] = threading.RLock()
+            return self.locks[interface]
+
+    def all(self):
+        return AllBusLock(self)
+
+
+class AllBusLock:
+    """Locks every bus, taking the bus locks in a fixed order"""
+    def __init__(self, bus_locks):
+        self.bus_locks = bus_locks
+        self.local = threading.local()  # .held = [[locks held], ...] per level of re-entry, in each thread
+
+    def snapshot(self):     # the bus locks handed out so far, in the order they are taken
+        with self.bus_locks.registry:
+            return [self.bus_locks.locks[interface] for interface in sorted(self.bus_locks.locks.keys(), key=str)]
+
+    def acquire(self):
+        locks = self.snapshot()
+        while True:
+            for lock in locks:
+                lock.acquire()
+            current = self.snapshot()
+            if current == locks:
+                break
+            # a bus lock was handed out meanwhile: start again with it, in order
+            for lock in reversed(locks):
+                lock.release()
+            locks = current
+        if not hasattr(self.local, "held"):
+            self.local.held = []
+        self.local.held.append(locks)
+        return True
+
+    def release(self):
+        for lock in reversed(self.local.held.pop()):
+            lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class LockChain:
+    """Takes several locks in order, and releases them in reverse order"""
+    def __init__(self, *locks):
+        self.locks = locks
+
+    def acquire(self):
+        for lock in self.locks:
+            lock.acquire()
+        return True
+
+    def release(self):
+        for lock in reversed(self.locks):
+            lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+bus_locks = BusLocks()  # process-wide, as the buses are
+
+def bus_lock(device_or_interface):  # the lock of the bus of a device, or of an interface named by interface_of()
+    return bus_locks.get(device_or_interface)
+
+
+# ____A process-wide VISA resource manager, and a pool of open sessions by resource name
+# so that re-connecting devices (e.g. restarting an experiment) reuses the sessions instead of re-opening them
+_visa = None
+_resource_manager = None
+_sessions = {}  # = {resource name: session}
+_pool_lock = threading.RLock()
+
+def visa_module():   # imported on first use, so that the drivers load without VISA installed
+    global _visa
+    if _visa is None:
+        import visa
+        _visa = visa
+    return _visa
+
+def resource_manager():
+    global _resource_manager
+    with _pool_lock:
+        if _resource_manager is None:
+            _resource_manager = visa_module().ResourceManager()
+        return _resource_manager
+
+def set_resource_manager(rm, visa=None):
+    """use rm (e.g. a simulated backend) for every session opened from now on, closing the sessions of the old one
+    visa: the module providing the constants for its sessions (e.g. elflab.devices.sim_visa), if not the real one"""
+    global _resource_manager, _visa
+    with _pool_lock:
+        close_all()
+        _resource_manager = rm
+        if visa is not None:
+            _visa = visa
+
+def gpib_resource(address):     # resource name of a bare GPIB primary address
+    return "GPIB::{:n}".format(address)
+
+def session_valid(session):
+    # cheap: no bus traffic, a closed session has lost its handle
+    try:
+        return session.session is not None
+    except Exception:
+        return False
+
+def open_resource(name, **kwargs):
+    """a session on the resource, reused if it is already open and still valid
+    kwargs (terminations, serial settings...) are applied to the session either way"""
+    with _pool_lock:
+        session = _sessions.get(name, None)
+        if (session is not None) and session_valid(session):
+            for (key, value) in kwargs.items():
+                setattr(session, key, value)
+        else:
+            session = resource_manager().open_resource(name, **kwargs)
+            _sessions[name] = session
+        return session
+
+def close_resource(name):
+    with _pool_lock:
+        session = _sessions.pop(name, None)
+        if session is not None:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+def close_all():
+    with _pool_lock:
+        for name in list(_sessions.keys()):
+            close_resource(name)
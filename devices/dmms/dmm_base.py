@@ -1,9 +1,19 @@
 """ DMMs Base class """
 
+import time
+import numpy as np
 from ..device_base import DeviceBase
 
 class DMMBase(DeviceBase):   
     def read(self):     # Returns (t, current reading in SI)
         raise Expection("DMM not implemented")
+    
+    # Returns (t, readings) as arrays of n readings; DMMs with a reading buffer transfer them in one block
+    def read_block(self, n):
+        t = np.empty((n,))
+        readings = np.empty((n,))
+        for i in range(n):
+            t[i], readings[i] = self.read()
+        return (t, readings)
 
         
\ No newline at end of file
@@ -1,9 +1,9 @@
 """ Simulated DMMs """
 
-from .dmm_base import DeviceBase
+from .dmm_base import DMMBase
 import time
 
-class ConstDMM(DeviceBase):
+class ConstDMM(DMMBase):
     """ A fake DMM only reads constant value """
     def __init__(self, reading=0.):
         self.reading = reading
@@ -1,5 +1,5 @@
 import time
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource
 import string
 from elflab.devices.dmms.dmm_base import DMMBase
 
@@ -9,8 +9,7 @@ class HP3478(DMMBase):
         self.connected = False
 
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         print("        HP3478 DMM connected, GPIB={:n}.".format(self.address))
         self.connected = True
  
@@ -1,17 +1,20 @@
 import time
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource
 import string
+import numpy as np
 from elflab.devices.dmms.dmm_base import DMMBase
 
 class Keithley2000(DMMBase):
+    MAX_BURST = 1024    # readings in the sample buffer
+    
     def __init__(self, address):
         self.address = address
         
         self.connected = False
+        self.burst = 1  # number of readings per trigger currently configured
 
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.get_instrument("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         idn = str(self.gpib.ask("*idn?".encode("ASCII")), encoding="ASCII")
         if not ("KEITHLEY INSTRUMENTS INC.,MODEL 2000" in idn):
             raise Exception("Keithley 2000 idn string does not match")
@@ -35,9 +38,53 @@ class Keithley2000(DMMBase):
     def read(self):     # Returns (relative timestamp, reading)
         if not self.connected:
             self.connect()
+        if self.burst != 1:
+            self.configBurst(1)
         reading = str(self.gpib.ask(":read?".encode("ASCII")), encoding="ASCII")
         t = time.perf_counter()
         return(t, float(reading))
+    
+    # Store n readings per trigger in the trace buffer
+    def configBurst(self, n):
+        if n < 1 or n > self.MAX_BURST:
+            raise ValueError("Keithley 2000: burst of {:d} readings out of range 1 to {:d}".format(n, self.MAX_BURST))
+        if n == 1:
+            self.gpib.write(":TRAC:FEED:CONT NEV".encode("ASCII"))
+            self.gpib.write(":SAMP:COUN 1".encode("ASCII"))
+        else:
+            self.gpib.write(":TRIG:SOUR IMM".encode("ASCII"))
+            self.gpib.write(":TRIG:COUN 1".encode("ASCII"))
+            self.gpib.write(":SAMP:COUN {:d}".format(n).encode("ASCII"))
+            self.gpib.write(":TRAC:POIN {:d}".format(n).encode("ASCII"))
+            self.gpib.write(":TRAC:FEED SENS".encode("ASCII"))
+        self.burst = n
+    
+    # Start a burst: the DMM fills its buffer while the bus is free for other instruments
+    def startBurst(self, n):
+        if not self.connected:
+            self.connect()
+        if self.burst != n:
+            self.configBurst(n)
+        self.gpib.write(":TRAC:CLE".encode("ASCII"))
+        self.gpib.write(":TRAC:FEED:CONT NEXT".encode("ASCII"))
+        self.gpib.write(":INIT".encode("ASCII"))
+        self.burstStart = time.perf_counter()
+    
+    # Wait for the burst to complete and transfer it, returns (t, readings) as arrays
+    # the time stamps are spread evenly from the start of the burst to the end of the transfer
+    def fetchBurst(self):
+        self.gpib.ask("*OPC?".encode("ASCII"))
+        block = str(self.gpib.ask(":TRAC:DATA?".encode("ASCII")), encoding="ASCII")
+        t = time.perf_counter()
+        readings = np.array([float(v) for v in block.split(",")])
+        return (np.linspace(self.burstStart, t, len(readings)), readings)
+    
+    def read_block(self, n):
+        if n == 1:
+            t, reading = self.read()
+            return (np.array([t]), np.array([reading]))
+        self.startBurst(n)
+        return self.fetchBurst()
             
         
 
@@ -48,8 +95,7 @@ class Keithley196(DMMBase):
         self.connected = False
 
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         print("        Keithley 196 DMM connected, GPIB={:n}.".format(self.address))
         self.connected = True
  
@@ -75,8 +121,7 @@ class Keithley617(DMMBase):
         self.connected = False
 
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         self.gpib.write("XF2C0X")   # Default to resistance readings
         time.sleep(self.DELAY)
         print("        Keithley 617 Electrometer connected, GPIB={:n}.".format(self.address))
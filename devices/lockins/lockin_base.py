@@ -37,6 +37,16 @@ class DigitalLockinBase(LockinBase):
         
     def setf(self):
         raise Exception("Lockin function not implemented.")
+    
+    # Buffered acquisition, where the lock-in supports it
+    def startBuffer(self, rate):    # returns the actual sample rate
+        raise Exception("Lockin function not implemented.")
+        
+    def readBuffer(self):   # return (t, channel 1, channel 2) as arrays, of the points since the last call
+        raise Exception("Lockin function not implemented.")
+        
+    def stopBuffer(self):
+        raise Exception("Lockin function not implemented.")
         
 class AnalogueLockinBase(LockinBase):  
     is_digital = False
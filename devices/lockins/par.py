@@ -1,5 +1,4 @@
 import time
-import visa
 from elflab.devices.lockins.lockin_base import AnalogueLockinBase
 
 class PAR124A(AnalogueLockinBase):  
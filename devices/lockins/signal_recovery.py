@@ -1,25 +1,68 @@
 import time
-import visa
+import re
+from elflab.devices.device_base import open_resource
+import numpy as np
 from elflab.devices.lockins.lockin_base import DigitalLockinBase
 
 class Model7124(DigitalLockinBase):  
+    # One compound command for a whole read: the responses are returned in order, (X, Y, R, theta, f, Vout)
+    FUSED_QUERY = "XY.;MP.;OF.;OA."
+    MAX_READS = 8   # read at most this many chunks to complete a response
+    FUSED_RETRY = 100   # after a compound read fails, read the parameters one by one this many times (successfully) before trying it again
+    
+    # Curve buffer
+    curveBits = {"X": 0, "Y": 1, "R": 2, "theta": 3}    # = {quantity: bit in CBD}
+    MIN_STORAGE_INTERVAL = 0.001    # in s
+    
     def __init__(self, address):
         self.address = address
         
         self.connected = False
         self.autosense = False
+        self.separateReads = 0  # separate reads still to make before trying the compound command again
+        self.curveRunning = False
     
     def connect(self):
-        rm = visa.ResourceManager()
-        self.inst = rm.open_resource(self.address)     
+        self.inst = open_resource(self.address)     
         self.connected = True
         print("        Signal Recovery Model 7124 lock-in amplifier, address={}.".format(self.address))     
-        
+    
+    # Read the responses to the last command until n numbers have been collected, "text" being what has been read already
+    # responses are separated by commas, semicolons, line ends or nulls
+    def readNumbers(self, n, text=""):
+        values = [float(v) for v in re.split(r"[,;\s\x00]+", text) if v != ""]
+        reads = 0
+        while (len(values) < n) and (reads < self.MAX_READS * max(1, n // 64)):
+            chunk = self.inst.read_raw().decode("ascii", errors="ignore")
+            values.extend(float(v) for v in re.split(r"[,;\s\x00]+", chunk) if v != "")
+            reads += 1
+        if len(values) < n:
+            raise Exception("Model 7124: expected {:d} values, received {:d}".format(n, len(values)))
+        return values[:n]
     
     def read(self):     # return (t, X, Y, R, theta, f, Vout)
         if not self.connected:
             self.connect()
-            
+        if self.separateReads == 0:
+            try:
+                self.inst.write(self.FUSED_QUERY)
+                (X, Y, R, theta, f, Vout) = self.readNumbers(6)
+            except Exception as err:
+                print("        [Model 7124:] WARNING: compound read failed ({}), reading the parameters one by one for the next {:d} reads.".format(err, self.FUSED_RETRY))
+                self.separateReads = self.FUSED_RETRY
+                try:
+                    self.inst.clear()   # drop whatever is left of the responses
+                except Exception:
+                    pass
+            else:
+                t = time.perf_counter()
+                return (t, X, Y, R, theta, f, Vout)
+        values = self.readSeparate()
+        if not np.any(np.isnan(values[1:])):    # only the good reads count down
+            self.separateReads -= 1
+        return values
+    
+    def readSeparate(self):     # one query per parameter, return (t, X, Y, R, theta, f, Vout)
         try:
             snap = self.inst.query("XY.").split('\n')[0]
             X, Y = (float(v) for v in snap.split(','))
@@ -47,4 +90,61 @@ class Model7124(DigitalLockinBase):
             Vout = float("nan")
         
         t = time.perf_counter()
-        return (t, X, Y, R, theta, f, Vout)
\ No newline at end of file
+        return (t, X, Y, R, theta, f, Vout)
+    
+    # ____Curve buffer streaming: the lock-in stores the curves at a fixed interval, for fast sweeps
+    def startCurve(self, interval, length, curves=("X", "Y", "R", "theta"), block=None):
+        """start storing the curves every "interval" s, for "length" points at most,
+        in blocks of "block" points (by default, all in one block), each transferred by readCurve() once complete"""
+        if not self.connected:
+            self.connect()
+        self.curves = list(curves)
+        self.curveMask = 0
+        for c in self.curves:
+            self.curveMask |= 1 << self.curveBits[c]
+        self.curveInterval = max(interval, self.MIN_STORAGE_INTERVAL)
+        self.curveLength = int(length)
+        self.curveBlock = int(block) if block is not None else self.curveLength
+        self.curveRead = 0  # points already transferred
+        self.curveHalted = False
+        self.curveRunning = True
+        self.startBlock()
+    
+    def startBlock(self):   # clear the buffer and store the next block of points
+        self.inst.write("NC")   # new curve: clear the buffer
+        self.inst.write("CBD {:d}".format(self.curveMask))
+        self.inst.write("LEN {:d}".format(min(self.curveBlock, self.curveLength - self.curveRead)))
+        self.inst.write("STR {:d}".format(int(round(self.curveInterval * 1000))))   # in ms
+        self.inst.write("TD")
+        self.curveT0 = time.perf_counter()
+    
+    def curveStatus(self):  # returns (acquisition status, number of points stored)
+        (status, sweeps, statusByte, points) = self.readNumbers(4, self.inst.query("M"))
+        return (int(status), int(points))
+    
+    def readCurve(self):
+        """transfer the block being stored once it is complete (or halted by stopCurve()), then start the next block
+        the 7124 dumps a curve from its first point only, so a block is transferred once, when complete, and nothing before:
+        the points stream in blocks of startCurve(block=...), with a gap of one transfer between blocks
+        poll until self.curveRunning is False; returns {"t": array, curve: array, ...}, empty while the block is being stored,
+        t reconstructed from the start time of the block and the storage interval"""
+        (status, n) = self.curveStatus()
+        data = {c: np.empty((0,)) for c in self.curves}
+        data["t"] = np.empty((0,))
+        if status != 0:     # still storing the block
+            return data
+        if n > 0:
+            for c in self.curves:
+                self.inst.write("DC. {:d}".format(self.curveBits[c]))
+                data[c] = np.array(self.readNumbers(n))
+            data["t"] = self.curveT0 + np.arange(n) * self.curveInterval
+        self.curveRead += n
+        if self.curveHalted or (n == 0) or (self.curveRead >= self.curveLength):
+            self.curveRunning = False
+        else:
+            self.startBlock()
+        return data
+    
+    def stopCurve(self):    # halt the acquisition, the points stored are then transferred by the next readCurve()
+        self.curveHalted = True
+        self.inst.write("HC")
@@ -1,6 +1,15 @@
 import time
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource
+import numpy as np
 from elflab.devices.lockins.lockin_base import DigitalLockinBase
+from elflab.devices.state_cache import StateCache
+
+# Constants
+CACHE_TTL = {"sens": 30.,       # sensitivity index
+             "Vout": 30.,       # reference amplitude
+             "f": 30.,          # reference frequency
+             "overload": 1.     # overload status
+             }     # time-to-live of each cached setting, in s, overridden by the ttl argument of the drivers
 
 class SR830(DigitalLockinBase):  
     idn_str = "SR830"   # Identifier string to check
@@ -13,21 +22,29 @@ class SR830(DigitalLockinBase):
             2.e-3, 5.e-3, 10.e-3,
             2.e-2, 5.e-2, 10.e-2,
             2.e-1, 5.e-1, 10.e-1)
+    
+    # Data buffer
+    bufferRates = tuple(0.0625 * 2**i for i in range(14))   # in Hz, for SRAT 0 to 13
+    BUFFER_SIZE = 16383     # points per channel
+    BUFFER_MARGIN = 512     # restart the buffer when fewer points than this are left
+    bufferChannels = {"X": (1, 0), "R": (1, 1), "Y": (2, 0), "theta": (2, 1)}   # = {quantity: (display channel, DDEF parameter)}
             
 
-    def __init__(self, address):
+    def __init__(self, address, ttl=None):
         self.address = address
         
         self.connected = False
         self.autosense = False
+        self.buffered = False
+        self.cache = StateCache(dict(CACHE_TTL, **(ttl or {})))    # sensitivity, reference amplitude, frequency and overload status
     
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         idn = self.gpib.query("*idn?")
         if (self.idn_str not in idn):
             raise Exception("SR830 lock-in amplifier idn string does not match")
         self.gpib.write("*CLS?")
+        self.cache.invalidate()
         print("        SR830 lock-in amplifier, GPIB={:n}.".format(self.address))        
         self.connected = True
     
@@ -37,37 +54,106 @@ class SR830(DigitalLockinBase):
         self.autosense = True
     
     def adjustSens(self, R): # R: current R value
-        i = int(self.gpib.query("sens?"))
+        i = self.cache.get("sens", lambda: int(self.gpib.query("sens?")))
         sens = self.sensList[i]
-        overloaded = int(self.gpib.query("LIAS?")) % 8
+        if abs(R) >= sens:  # at full scale: check the overload status now
+            self.cache.invalidate("overload")
+        overloaded = self.cache.get("overload", lambda: int(self.gpib.query("LIAS?")) % 8)
         
         if (i < 26) and (overloaded or (abs(R) / sens > self.highSens)):
-            self.gpib.write("sens {:n}".format(i+1))
+            self.setSens(i+1)
         elif (i > 0) and (overloaded or (abs(R) / sens < self.lowSens)):
-            self.gpib.write("sens {:n}".format(i-1))
+            self.setSens(i-1)
+    
+    def setSens(self, i):   # i: index in sensList
+        self.gpib.write("sens {:n}".format(i))
+        self.cache.set("sens", i)
+        self.cache.invalidate("overload")   # (LIAS? clears on reading) see whether the new range settles
     
     def setf(self, f):
         self.gpib.write("FREQ {:.4f}".format(f))
         fnew = float(self.gpib.query("FREQ?"))
+        self.cache.set("f", fnew)
         
         if (abs(fnew - f) / f <= 1.e-4) or (abs(fnew - f) <= 0.0001):
             return True
         else:
             return False
     
+    def setVout(self, Vout):    # reference (sine out) amplitude in V
+        self.gpib.write("SLVL {:.3f}".format(Vout))
+        self.cache.set("Vout", float(self.gpib.query("SLVL?")))
+    
     def read(self):     # return (t, X, Y, R, theta, f, Vout)
         if not self.connected:
             self.connect()
         snap = str(self.gpib.query("SNAP?1,2,3,4,9"))
         t = time.perf_counter()
         (X, Y, R, theta, f) = [float(v) for v in snap.split(',')]
+        self.cache.set("f", f)
         
-        Vout = float(self.gpib.query("SLVL?"))
+        Vout = self.cache.get("Vout", lambda: float(self.gpib.query("SLVL?")))
         
         if self.autosense:
             self.adjustSens(R)
             
         return (t, X, Y, R, theta, f, Vout)
+    
+    # ____Buffered acquisition: the lock-in samples into its internal buffer, which is transferred in blocks
+    def startBuffer(self, rate, ch1="X", ch2="Y"):
+        """configure the data buffer to store ch1 ("X" or "R") and ch2 ("Y" or "theta") at the rate (in Hz) nearest to "rate", and start filling it
+        returns the actual sample rate"""
+        if not self.connected:
+            self.connect()
+        if (ch1 not in self.bufferChannels) or (self.bufferChannels[ch1][0] != 1):
+            raise ValueError("SR830: cannot buffer \"{}\" on channel 1".format(ch1))
+        if (ch2 not in self.bufferChannels) or (self.bufferChannels[ch2][0] != 2):
+            raise ValueError("SR830: cannot buffer \"{}\" on channel 2".format(ch2))
+        i = int(np.argmin([abs(r - rate) for r in self.bufferRates]))
+        self.bufferRate = self.bufferRates[i]
+        self.gpib.write("PAUS")
+        self.gpib.write("DDEF 1,{:d},0".format(self.bufferChannels[ch1][1]))
+        self.gpib.write("DDEF 2,{:d},0".format(self.bufferChannels[ch2][1]))
+        self.gpib.write("SRAT {:d}".format(i))
+        self.gpib.write("SEND 0")   # one shot: stop when full, so that the point indices never wrap
+        self.gpib.write("TSTR 0")
+        self.restartBuffer()
+        self.buffered = True
+        return self.bufferRate
+    
+    def restartBuffer(self):
+        self.gpib.write("REST")
+        self.gpib.write("STRT")
+        # the time of the first point, the others are reconstructed from the sample rate
+        self.bufferT0 = time.perf_counter()
+        self.bufferRead = 0     # points already transferred
+    
+    def transferBuffer(self, channel, start, n):  # n points from the bin "start" of the channel, in binary
+        self.gpib.write("TRCB? {:d},{:d},{:d}".format(channel, start, n))
+        raw = self.gpib.read_raw()
+        return np.frombuffer(raw, dtype='<f4', count=n).astype(float)
+    
+    def readBuffer(self):
+        """transfer the points stored since the last call
+        returns (t, ch1, ch2) as numpy arrays, t reconstructed from the start time and the sample rate"""
+        if not self.buffered:
+            raise Exception("SR830: the data buffer has not been started")
+        n = int(self.gpib.query("SPTS?"))
+        start = self.bufferRead
+        if n <= start:
+            return (np.empty((0,)), np.empty((0,)), np.empty((0,)))
+        ch1 = self.transferBuffer(1, start, n - start)
+        ch2 = self.transferBuffer(2, start, n - start)
+        t = self.bufferT0 + np.arange(start, n) / self.bufferRate
+        self.bufferRead = n
+        if n >= self.BUFFER_SIZE - self.BUFFER_MARGIN:
+            # nearly full: start again, with a gap of one transfer
+            self.restartBuffer()
+        return (t, ch1, ch2)
+    
+    def stopBuffer(self):
+        self.gpib.write("PAUS")
+        self.buffered = False
         
 class SR844(DigitalLockinBase):  
     idn_str = "SR844"   # Identifier string to check
@@ -82,19 +168,20 @@ class SR844(DigitalLockinBase):
             2.e-1, 5.e-1, 10.e-1)
             
 
-    def __init__(self, address):
+    def __init__(self, address, ttl=None):
         self.address = address
         
         self.connected = False
         self.autosense = False
+        self.cache = StateCache(dict(CACHE_TTL, **(ttl or {})))    # sensitivity, frequency and overload status
     
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         idn = self.gpib.query("*idn?")
         if (self.idn_str not in idn):
             raise Exception("SR844 lock-in amplifier idn string does not match")
         self.gpib.write("*CLS?")
+        self.cache.invalidate()
         print("        SR844 lock-in amplifier, GPIB={:n}.".format(self.address))        
         self.connected = True
     
@@ -104,18 +191,26 @@ class SR844(DigitalLockinBase):
         self.autosense = True
     
     def adjustSens(self, R): # R: current R value
-        i = int(self.gpib.query("sens?"))
+        i = self.cache.get("sens", lambda: int(self.gpib.query("sens?")))
         sens = self.sensList[i]
-        overloaded = int(self.gpib.query("LIAS?")) % 8
+        if abs(R) >= sens:  # at full scale: check the overload status now
+            self.cache.invalidate("overload")
+        overloaded = self.cache.get("overload", lambda: int(self.gpib.query("LIAS?")) % 8)
         
         if (i < 26) and (overloaded or (abs(R) / sens > self.highSens)):
-            self.gpib.write("sens {:n}".format(i+1))
+            self.setSens(i+1)
         elif (i > 0) and (overloaded or (abs(R) / sens < self.lowSens)):
-            self.gpib.write("sens {:n}".format(i-1))
+            self.setSens(i-1)
+    
+    def setSens(self, i):   # i: index in sensList
+        self.gpib.write("sens {:n}".format(i))
+        self.cache.set("sens", i)
+        self.cache.invalidate("overload")   # (LIAS? clears on reading) see whether the new range settles
     
     def setf(self, f):
         self.gpib.write("FREQ {:.4f}".format(f))
         fnew = float(self.gpib.query("FREQ?"))
+        self.cache.set("f", fnew)
         
         if (abs(fnew - f) / f <= 1.e-4) or (abs(fnew - f) <= 0.0001):
             return True
@@ -128,7 +223,7 @@ class SR844(DigitalLockinBase):
         snap = str(self.gpib.query("SNAP?1,2,3,5,8"))
         t = time.perf_counter()
         (X, Y, R, theta, f) = [float(v) for v in snap.split(',')]
-        
+        self.cache.set("f", f)
         
         if self.autosense:
             self.adjustSens(R)
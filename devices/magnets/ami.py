@@ -1,33 +1,33 @@
 """ AMI Magnet Power Supplies """
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource, visa_module, RetryPolicy, RetryExhausted
 import time
 from .magnet_base import MagnetBase
 
 class Model420(MagnetBase):
-    def __init__(self, address):
+    def __init__(self, address, retry=None):
         self.address = address
         
         self.connected = False
         self.H = float('nan')
         self.I = float('nan')
+        self.stale = False  # True when the last read failed and returned the previous field
+        self.retry = retry if retry is not None else RetryPolicy()
         
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address))
+        self.gpib = open_resource(gpib_resource(self.address))
         self.gpib.write("CONFigure:FIELD:UNITS 1")  # Configure the field unit to Tesla
         print("        AMI Model 420 magnet programmer connected, GPIB={:n}.".format(self.address))        
         self.connected = True
     
-    def read(self): # returns (t, H/Tesla, I_magnet/A)
-        err = True  # error flag for detecting GPIB error
-        while err:
-            try:        
-                stat = str(self.gpib.query("FIELD:MAGnet?"))
-                self.H = float(stat)
-            except:
-                pass
-            else:
-                err = False
+    def read(self): # returns (t, H/Tesla, I_magnet/A), the last good field (flagged by self.stale) if the query keeps failing
+        try:
+            self.H = self.retry.call(lambda: float(str(self.gpib.query("FIELD:MAGnet?"))), session=self.gpib)
+        except RetryExhausted as err:
+            if not self.stale:
+                print("        [AMI Model 420:] WARNING: read failed ({}), returning the last good field.".format(err))
+            self.stale = True
+        else:
+            self.stale = False
             
         return (time.perf_counter(), self.H, float("nan"))
         
@@ -44,8 +44,8 @@ class Model430(MagnetBase):
         self.I = float('nan')
         
     def connect(self):
-        rm = visa.ResourceManager()
-        self.instrument = rm.open_resource(self.address, baud_rate = 115200, parity = visa.constants.Parity.none, data_bits = 8, stop_bits = visa.constants.StopBits.one, flow_control=visa.constants.VI_ASRL_FLOW_RTS_CTS)
+        visa = visa_module()
+        self.instrument = open_resource(self.address, baud_rate = 115200, parity = visa.constants.Parity.none, data_bits = 8, stop_bits = visa.constants.StopBits.one, flow_control=visa.constants.VI_ASRL_FLOW_RTS_CTS)
         
         
         idn = self.instrument.query("*idn?")
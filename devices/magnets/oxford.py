@@ -1,71 +1,79 @@
 """ Oxford Magnet Power Supplies """
-import visa
+from elflab.devices.device_base import open_resource, gpib_resource, bus_lock, RetryPolicy, RetryExhausted
+from elflab.devices.state_cache import StateCache
 import time
+import contextlib
 from .magnet_base import MagnetBase
 
 import tkinter as tk
 from tkinter import ttk
 
+# Constants
+HEATER_REFRESH = 10.    # in s, re-read the switch heater state at least this often (e.g. if changed on the front panel)
+
 class IPS120_10(MagnetBase):
-    def __init__(self, address):
+    PERSISTENT_STATES = ('0', '2')  # switch heater digit of the status: 0 off at zero field, 2 off at field
+    
+    def __init__(self, address, retry=None, heater_refresh=HEATER_REFRESH):
         self.address = address
         
         self.connected = False
         self.H = float('nan')
         self.I = float('nan')
+        self.stale = False  # True when the last read failed and returned the previous values
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.cache = StateCache({"heater": heater_refresh})   # switch heater state, so that a read needs no status query
         
     def connect(self):
-        rm = visa.ResourceManager()
-        self.gpib = rm.open_resource("GPIB::{:n}".format(self.address), read_termination='\r', write_termination='\r')
+        self.gpib = open_resource(gpib_resource(self.address), read_termination='\r', write_termination='\r')
         self.gpib.write("Q4")
+        self.cache.invalidate()
         print("        Oxford IPS 120-10 magnet power supply connected, GPIB={:n}.".format(self.address))        
         self.connected = True
     
-    def read(self): # returns (t, H/Tesla, I_magnet/A)
-        stat = str(self.gpib.query("X"))
-        while len(stat) != 15:
-            stat = str(self.gpib.query("X"))
-        
-        if (stat[8] == '0') or (stat[8] == '2'):    # persistent switch closed
-            # use persistent values
-            err = True  # error flag for detecting GPIB error
-            while err:
-                try:
-                    s = str(self.gpib.query("R18")).strip("Rr")
-                    self.H = float(s)
-                except:
-                    pass
-                else:
-                    err = False
-            err = True  # error flag for detecting GPIB error
-            while err:
-                try:
-                    s = str(self.gpib.query("R16")).strip("Rr")
-                    self.I = float(s)
-                except:
-                    pass
-                else:
-                    err = False
-        else:   # persistent switch open or not present
-            # use demand / measured values
-            err = True  # error flag for detecting GPIB error
-            while err:
-                try:
-                    s = str(self.gpib.query("R7")).strip("Rr")  # Demand field
-                    self.H = float(s)
-                except:
-                    pass
-                else:
-                    err = False
-            err = True  # error flag for detecting GPIB error
-            while err:
-                try:
-                    s = str(self.gpib.query("R2")).strip("Rr")  # Measured Current
-                    self.I = float(s)
-                except:
-                    pass
-                else:
-                    err = False
+    def query_value(self, command):    # a numerical reading, returned as "R+1.2345"
+        return float(str(self.gpib.query(command)).strip("Rr"))
+    
+    def get_status(self, deadline=None):  # the full status string "XmnAnCnHnMmnPmn", caching the switch heater state
+        stat = self.retry.call(lambda: str(self.gpib.query("X")), check=lambda s: len(s) == 15, deadline=deadline, session=self.gpib)
+        self.cache.set("heater", stat[8])
+        return stat
+    
+    def get_heater(self, deadline=None):  # the switch heater digit of the status, from the cache if recent enough
+        return self.cache.get("heater", lambda: self.get_status(deadline)[8])
+    
+    def set_heater(self, on, instrument_lock=None):   # switch the persistent switch heater on or off
+        """instrument_lock: the lock the measurement holds over its reads, when it does not lock the buses itself
+        (e.g. kernel.instrument_lock, for experiments without bus_locking); the bus of the supply is locked either way"""
+        if not self.connected:
+            raise Exception("[IPS 120-10:] not connected.")
+        with (instrument_lock if instrument_lock is not None else contextlib.nullcontext()), bus_lock(self):
+            try:
+                reply = str(self.gpib.query("H1" if on else "H0")).strip()
+            finally:
+                self.cache.invalidate("heater")     # read the new state back on the next read
+        if reply != "H":    # "?H1" if the command is refused
+            raise Exception("[IPS 120-10:] switch heater command refused, reply: \"{}\"".format(reply))
+    
+    def read(self): # returns (t, H/Tesla, I_magnet/A), the last good values (flagged by self.stale) if the queries keep failing
+        deadline = self.retry.deadline()
+        try:
+            if self.get_heater(deadline) in self.PERSISTENT_STATES:    # persistent switch closed
+                # use persistent values
+                H = self.retry.call(self.query_value, "R18", deadline=deadline, session=self.gpib)
+                I = self.retry.call(self.query_value, "R16", deadline=deadline, session=self.gpib)
+            else:   # persistent switch open or not present
+                # use demand / measured values
+                H = self.retry.call(self.query_value, "R7", deadline=deadline, session=self.gpib)    # Demand field
+                I = self.retry.call(self.query_value, "R2", deadline=deadline, session=self.gpib)    # Measured Current
+        except RetryExhausted as err:
+            if not self.stale:
+                print("        [IPS 120-10:] WARNING: read failed ({}), returning the last good values.".format(err))
+            self.stale = True
+        else:
+            self.H = H
+            self.I = I
+            self.stale = False
             
         return (time.perf_counter(), self.H, self.I)
         
@@ -0,0 +1,353 @@
+""" A simulated VISA backend, for running the real drivers (and the kernels above them) without any instrument
+    Each simulated instrument answers like the real one, after a configurable per-command latency with jitter,
+    occasionally failing if asked to, and every transaction holds its bus, as on a real GPIB board
+        usage:  rm = sim_visa.ResourceManager(jitter=0.001)
+                rm.add("GPIB::8", sim_visa.SR830Sim())
+                rm.add("ASRL5::INSTR", sim_visa.Model430Sim(), latency=0.02)
+                device_base.set_resource_manager(rm, sim_visa)
+    After this, SR830(8).read() and the like go through the simulation
+"""
+import time
+import math
+import re
+import random
+import threading
+import types
+from elflab.devices.device_base import interface_of
+
+# Constants
+DEFAULT_LATENCY = 0.004     # processing time of a command by the instrument, in s
+DEFAULT_TRANSFER = 0.0005   # bus time of one write or read, in s
+DEFAULT_TIMEOUT = 2000      # in ms, as in VISA
+
+
+class SimVisaError(Exception):  # stands for visa.VisaIOError
+    pass
+
+
+# The few VISA constants the drivers use, so that this module can stand in for visa
+constants = types.SimpleNamespace(
+    Parity=types.SimpleNamespace(none=0, odd=1, even=2),
+    StopBits=types.SimpleNamespace(one=10, one_and_a_half=15, two=20),
+    VI_ASRL_FLOW_NONE=0,
+    VI_ASRL_FLOW_RTS_CTS=4
+)
+
+
+class ResourceManager:
+    """Hands out sessions on the simulated instruments, in place of visa.ResourceManager
+    latency, jitter (standard deviation, in s), error_rate (probability of a read timing out)
+    and garble_rate (probability of a corrupted response) are the defaults for every instrument added"""
+    def __init__(self, latency=DEFAULT_LATENCY, jitter=0., error_rate=0., garble_rate=0., transfer=DEFAULT_TRANSFER, seed=None):
+        self.defaults = {"latency": latency, "jitter": jitter, "error_rate": error_rate,
+                         "garble_rate": garble_rate, "transfer": transfer}
+        self.instruments = {}   # = {resource name: (responder, settings)}
+        self.bus_locks = {}     # = {interface: Lock}, one transaction at a time on each bus
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def add(self, name, responder, **settings):
+        """simulate an instrument at the resource name, settings overriding the defaults
+        latency may also be a dict {command prefix: latency}, the key None giving the default"""
+        unknown = set(settings.keys()) - set(self.defaults.keys())
+        if len(unknown) > 0:
+            raise ValueError("[sim_visa] unknown settings: {}".format(unknown))
+        merged = self.defaults.copy()
+        merged.update(settings)
+        self.instruments[name] = (responder, merged)
+        return responder
+
+    def bus_lock(self, name):
+        interface = interface_of(types.SimpleNamespace(address=name))
+        with self.lock:
+            if interface not in self.bus_locks:
+                self.bus_locks[interface] = threading.Lock()
+            return self.bus_locks[interface]
+
+    def list_resources(self):
+        return tuple(self.instruments.keys())
+
+    def open_resource(self, name, **kwargs):
+        if name not in self.instruments:
+            raise SimVisaError("[sim_visa] no instrument simulated at \"{}\"".format(name))
+        (responder, settings) = self.instruments[name]
+        return SimInstrument(self, name, responder, settings, **kwargs)
+
+    def close(self):
+        pass
+
+
+class SimInstrument:
+    """A session on a simulated instrument, with the methods of a visa resource the drivers use"""
+    def __init__(self, rm, name, responder, settings, **kwargs):
+        self.rm = rm
+        self.resource_name = name
+        self.responder = responder
+        self.settings = settings
+        self.bus = rm.bus_lock(name)
+        self.session = name     # None once closed
+        self.timeout = DEFAULT_TIMEOUT
+        self.read_termination = None
+        self.write_termination = None
+        self.response = None    # (text, time at which the instrument has it ready)
+        for (key, value) in kwargs.items():     # terminations, serial settings...
+            setattr(self, key, value)
+        self.n_transactions = 0
+        self.n_errors = 0
+
+    def latency(self, command):
+        latency = self.settings["latency"]
+        if isinstance(latency, dict):
+            matches = [prefix for prefix in latency.keys() if (prefix is not None) and command.upper().startswith(prefix.upper())]
+            if len(matches) > 0:
+                latency = latency[max(matches, key=len)]    # the most specific prefix
+            else:
+                latency = latency.get(None, DEFAULT_LATENCY)
+        jitter = self.settings["jitter"]
+        if jitter > 0:
+            latency += self.rm.random.gauss(0., jitter)
+        return max(latency, 0.)
+
+    def transact(self, duration):   # hold the bus for the duration of a transfer
+        self.bus.acquire()
+        try:
+            time.sleep(duration)
+        finally:
+            self.bus.release()
+
+    def check_open(self):
+        if self.session is None:
+            raise SimVisaError("[sim_visa] session \"{}\" is closed".format(self.resource_name))
+
+    def write(self, command):
+        self.check_open()
+        if self.write_termination is not None:
+            command = command.rstrip(self.write_termination)
+        self.transact(self.settings["transfer"])
+        self.n_transactions += 1
+        # compound commands are processed one after another, their responses joined
+        responses = []
+        ready = time.perf_counter()
+        for sub in command.split(";"):
+            sub = sub.strip()
+            if sub == "":
+                continue
+            ready += self.latency(sub)
+            r = self.responder.respond(sub)
+            if r is not None:
+                responses.append(str(r))
+        if len(responses) > 0:
+            self.response = (";".join(responses), ready)
+        return len(command)
+
+    def read_raw(self):
+        self.check_open()
+        self.bus.acquire()  # the bus is held while the instrument is addressed to talk
+        try:
+            if (self.settings["error_rate"] > 0) and (self.rm.random.random() < self.settings["error_rate"]):
+                self.response = None    # injected error: the response is lost
+            if self.response is None:   # nothing to say: times out, as a real instrument would
+                self.n_errors += 1
+                time.sleep(self.timeout / 1000.)
+                raise SimVisaError("[sim_visa] \"{}\": timeout expired before operation completed".format(self.resource_name))
+            (text, ready) = self.response
+            self.response = None
+            delay = ready - time.perf_counter()
+            time.sleep(max(delay, 0.) + self.settings["transfer"])
+        finally:
+            self.bus.release()
+        self.n_transactions += 1
+        if isinstance(text, str):
+            if (self.settings["garble_rate"] > 0) and (self.rm.random.random() < self.settings["garble_rate"]):
+                self.n_errors += 1
+                text = text[:self.rm.random.randrange(len(text) + 1)] + "?"
+            text = (text + (self.read_termination or "\n")).encode("ascii")
+        return text     # binary responses (e.g. buffer transfers) are passed through
+
+    def read(self):
+        text = self.read_raw().decode("ascii")
+        if self.read_termination:
+            return text.rstrip(self.read_termination)
+        return text.rstrip("\n")
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def clear(self):
+        self.response = None
+
+    def close(self):
+        self.session = None
+
+
+# ____Responders: the command sets of the simulated instruments
+class Responder:
+    """Answers the commands of one instrument: respond() returns the response, or None for a command without one
+    handlers are the methods named in "commands", by command header"""
+    idn = "SIMULATED"
+    commands = {}   # = {command header (upper case): method name}
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def respond(self, command):
+        match = re.match(r"\s*([*:\w]+\??)\s*(.*)$", command, re.DOTALL)
+        if match is None:
+            return None
+        header = match.group(1).upper()
+        argument = match.group(2).strip()
+        if header == "*IDN?":
+            return self.idn
+        if header in ("*CLS", "*CLS?", "*RST"):
+            return None
+        handler = self.commands.get(header, None)
+        if handler is None:
+            return None     # ignored: a query of it will time out
+        return getattr(self, handler)(argument)
+
+
+class SR830Sim(Responder):
+    """SR830 lock-in amplifier, measuring a signal R = amplitude * Vout drifting slowly in phase"""
+    idn = "Stanford_Research_Systems,SR830,s/n00000,ver1.07"
+    commands = {"SNAP?": "snap", "SENS": "sens", "SENS?": "sens", "LIAS?": "lias",
+                "FREQ": "freq", "FREQ?": "freq", "SLVL": "slvl", "SLVL?": "slvl"}
+
+    def __init__(self, amplitude=1.e-3, f=13.7, Vout=1., sens=20, noise=1.e-6):
+        super().__init__()
+        self.amplitude = amplitude
+        self.f = f
+        self.Vout = Vout
+        self.sens_index = sens
+        self.noise = noise
+
+    def outputs(self):
+        R = abs(self.amplitude * self.Vout + random.gauss(0., self.noise))
+        theta = 10. * math.sin(self.elapsed() / 60.)   # in degrees
+        X = R * math.cos(math.radians(theta))
+        Y = R * math.sin(math.radians(theta))
+        return {1: X, 2: Y, 3: R, 4: theta, 5: theta, 8: self.f, 9: self.f}
+
+    def snap(self, argument):
+        outputs = self.outputs()
+        return ",".join("{:.6e}".format(outputs[int(i)]) for i in argument.split(","))
+
+    def sens(self, argument):
+        if argument == "":
+            return "{:d}".format(self.sens_index)
+        self.sens_index = int(argument)
+
+    def lias(self, argument):
+        return "0"
+
+    def freq(self, argument):
+        if argument == "":
+            return "{:.4f}".format(self.f)
+        self.f = float(argument)
+
+    def slvl(self, argument):
+        if argument == "":
+            return "{:.3f}".format(self.Vout)
+        self.Vout = float(argument)
+
+
+class Lakeshore340Sim(Responder):
+    """Lakeshore 340 temperature controller, each channel relaxing towards the set point of loop 1"""
+    idn = "LSCI,MODEL340,000000,061407"
+    commands = {"KRDG?": "krdg", "SETP": "setp", "SETP?": "setp", "RAMP": "ramp", "RAMPST?": "rampst",
+                "HTR?": "htr", "AOUT?": "aout"}
+
+    def __init__(self, T=4.2, tau=60., noise=1.e-4):
+        super().__init__()
+        self.T = {ch: T for ch in ("A", "B", "C", "D")}
+        self.setpoints = {1: T, 2: T}
+        self.tau = tau  # time constant, in s
+        self.noise = noise
+        self.last = time.perf_counter()
+
+    def evolve(self):
+        now = time.perf_counter()
+        decay = math.exp(-(now - self.last) / self.tau)
+        self.last = now
+        for ch in self.T:
+            self.T[ch] = self.setpoints[1] + (self.T[ch] - self.setpoints[1]) * decay
+
+    def krdg(self, argument):
+        self.evolve()
+        return "{:+.4f}".format(self.T[argument.strip().upper()] + random.gauss(0., self.noise))
+
+    def setp(self, argument):
+        fields = [v.strip() for v in argument.split(",")]
+        if len(fields) == 1:
+            return "{:+.4f}".format(self.setpoints[int(fields[0])])
+        self.evolve()
+        self.setpoints[int(fields[0])] = float(fields[1])
+
+    def ramp(self, argument):
+        pass
+
+    def rampst(self, argument):
+        return "0"
+
+    def htr(self, argument):
+        return "{:.2f}".format(min(100., max(0., 10. * (self.setpoints[1] - self.T["A"]))))
+
+    def aout(self, argument):
+        return "0.00"
+
+
+class IPS120Sim(Responder):
+    """Oxford IPS 120-10 magnet power supply, sweeping the field at a constant rate, persistent switch heater on"""
+    idn = "IPS120-10  Version 3.07  (c) OXFORD 1996"
+    commands = {"Q4": "ignore", "X": "status", "R2": "current", "R7": "field", "R16": "current", "R18": "field",
+                "H0": "heater_off", "H1": "heater_on", "H2": "heater_on"}
+    TESLA_PER_AMP = 0.1
+
+    def __init__(self, H=0., rate=1.e-3):
+        super().__init__()
+        self.H0 = H
+        self.rate = rate    # in T/s
+        self.heater = 1     # status digit: 0 off at zero field, 1 on, 2 off at field
+
+    def H(self):
+        return self.H0 + self.rate * self.elapsed()
+
+    def ignore(self, argument):
+        return None
+
+    def status(self, argument):
+        return "X00A0C0H{:d}M00P00".format(self.heater)
+
+    def field(self, argument):
+        return "R{:+.5f}".format(self.H())
+
+    def current(self, argument):
+        return "R{:+.4f}".format(self.H() / self.TESLA_PER_AMP)
+
+    def heater_on(self, argument):
+        self.heater = 1
+        return "H"
+
+    def heater_off(self, argument):
+        self.heater = 0 if abs(self.H()) < 1.e-4 else 2
+        return "H"
+
+
+class Model430Sim(Responder):
+    """AMI Model 430 magnet programmer, sweeping the field at a constant rate"""
+    idn = "AMERICAN MAGNETICS INC.,MODEL 430,2.01"
+    commands = {"CONFIGURE:FIELD:UNITS": "ignore", "FIELD:MAGNET?": "field"}
+
+    def __init__(self, H=0., rate=1.e-3):
+        super().__init__()
+        self.H0 = H
+        self.rate = rate    # in T/s
+
+    def ignore(self, argument):
+        return None
+
+    def field(self, argument):
+        return "{:.6f}".format(self.H0 + self.rate * self.elapsed())
@@ -0,0 +1,37 @@
+""" A cache of instrument settings (lock-in sensitivity, reference frequency, magnet switch heater state...)
+    kept from the driver's own writes, and re-queried only when too old, to save round trips on every read
+"""
+import time
+
+
+class StateCache:
+    """Values of settings, as last written or queried, each valid for its time-to-live
+    A key without a time-to-live is valid until invalidated"""
+    def __init__(self, ttl=None):   # ttl = {key: time-to-live in s}
+        self.ttl = ttl.copy() if ttl is not None else {}
+        self.values = {}
+        self.times = {}     # perf_counter() of the last update of each value
+
+    def valid(self, key):
+        if key not in self.values:
+            return False
+        ttl = self.ttl.get(key, None)
+        return (ttl is None) or (time.perf_counter() - self.times[key] < ttl)
+
+    def get(self, key, query):
+        """the cached value of key, or query() if it is missing or expired"""
+        if not self.valid(key):
+            self.set(key, query())
+        return self.values[key]
+
+    def set(self, key, value):  # after writing the setting, or reading it back in passing
+        self.values[key] = value
+        self.times[key] = time.perf_counter()
+
+    def invalidate(self, key=None):     # all keys if None
+        if key is None:
+            self.values = {}
+            self.times = {}
+        else:
+            self.values.pop(key, None)
+            self.times.pop(key, None)
@@ -48,5 +48,16 @@ class SiDiode(ThermBase):
         else:
             T = float("nan")
         return (t, T, self.Itherm, Vtherm)
+    
+    # Average n readings of the DMM in one block, returns (t, T, I, V, standard error of V)
+    def read_mean(self, n):
+        t, V = self.dmm.read_block(n)
+        Vtherm = np.nanmean(V)
+        dV = np.nanstd(V, ddof=1) / np.sqrt(np.count_nonzero(~np.isnan(V))) if n > 1 else float("nan")
+        if (Vtherm >= self.Vmin) and (Vtherm <= self.Vmax):
+            T = self.VtoT(Vtherm)
+        else:
+            T = float("nan")
+        return (np.mean(t), T, self.Itherm, Vtherm, dV)
         
         
\ No newline at end of file
@@ -0,0 +1,79 @@
+""" Benchmark of the DataSet file input / output, on a synthetic log written like csvlogger's
+        usage:  python -m elflab.examples.bench_datasets [number of rows]
+"""
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+from elflab import datasets
+from elflab.analysis import errors
+
+N = 1000000     # rows
+N_COLUMNS = 8
+
+def make_dataset(n, n_columns=N_COLUMNS):
+    rng = np.random.default_rng(0)
+    data = datasets.DataSet([("t", np.arange(n) * 0.1)] + [("x{:d}".format(i), rng.standard_normal(n)) for i in range(n_columns - 1)])
+    data.errors = {key: np.abs(rng.standard_normal(n)) * 1.e-3 for key in data}
+    return data
+
+def bench(label, function, n):
+    t = time.perf_counter()
+    result = function()
+    dt = time.perf_counter() - t
+    print("    {:<40s}{:10.3f} s{:14.4g} rows/s".format(label, dt, n / dt))
+    return result
+
+def main(n=N):
+    data = make_dataset(n)
+    keys = list(data.keys())
+    column_mapping = {i: key for (i, key) in enumerate(keys)}
+    with tempfile.TemporaryDirectory() as folder:
+        filepath = os.path.join(folder, "bench.dat")
+        print("DataSet of {:d} rows x {:d} columns, with errors:".format(n, len(keys)))
+        bench("save_csv_legacy", lambda: datasets.save_csv_legacy(data, filepath), n)
+        with open(filepath, "rb") as f:
+            old_text = f.read()
+        bench("save_csv", lambda: datasets.save_csv(data, filepath), n)
+        with open(filepath, "rb") as f:
+            if f.read() != old_text:
+                raise Exception("[bench_datasets] save_csv and save_csv_legacy disagree")
+        print("    ({:.1f} MB of csv)".format(os.path.getsize(filepath) / 1.e6))
+        bench("save_csv, gzipped", lambda: datasets.save_csv(data, filepath + ".gz"), n)
+        print("    ({:.1f} MB gzipped)".format(os.path.getsize(filepath + ".gz") / 1.e6))
+        old = bench("load_csv_legacy", lambda: datasets.load_csv_legacy(filepath, column_mapping, error_column=len(keys)), n)
+        new = bench("load_csv", lambda: datasets.load_csv(filepath, column_mapping, error_column=len(keys)), n)
+        for key in keys:
+            if not (np.array_equal(old[key], new[key]) and np.array_equal(old.errors[key], new.errors[key])):
+                raise Exception("[bench_datasets] load_csv and load_csv_legacy disagree on \"{}\"".format(key))
+        
+        binpath = os.path.join(folder, "bench.dataset")
+        bench("save_binary", lambda: datasets.save_binary(data, binpath), n)
+        mapped = bench("load_binary (memory-mapped)", lambda: datasets.load_binary(binpath), n)
+        bench("    then the mean of one column", lambda: np.mean(mapped[keys[1]]), n)
+        bench("load_binary (into memory)", lambda: datasets.load_binary(binpath, mmap_mode=None), n)
+        
+        # the views of a memory-mapped set read as their copies in memory, and refuse new columns
+        for (label, view) in (("sorted", mapped.sort(keys[1])), ("masked", mapped.mask(mapped[keys[1]] > 0.))):
+            copy = view.in_memory()
+            for key in keys:
+                if not (np.array_equal(dict(view.items())[key], copy[key]) and np.array_equal(view.errors.copy()[key], copy.errors[key])):
+                    raise Exception("[bench_datasets] {} view and its copy disagree on \"{}\"".format(label, key))
+            try:
+                view["z"] = view[keys[1]] * 2.
+            except ValueError:
+                pass
+            else:
+                raise Exception("[bench_datasets] a column was set on a {} view".format(label))
+        
+        # any other callable takes the per-sample path
+        old = bench("downsample by 100, per sample", lambda: datasets.downsample(data, 100, lambda v: np.nanmean(v), lambda v, e: errors.std(v, e)), n)
+        new = bench("downsample by 100, vectorised", lambda: datasets.downsample(data, 100, np.nanmean, errors.std), n)
+        for key in keys:
+            if not (np.allclose(old[key], new[key]) and np.allclose(old.errors[key], new.errors[key])):
+                raise Exception("[bench_datasets] vectorised and per-sample downsample disagree on \"{}\"".format(key))
+        bench("downsample by 100, memory-mapped", lambda: datasets.downsample(mapped, 100, np.nanmean, errors.std), n)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N)
@@ -0,0 +1,64 @@
+""" Benchmark of the drivers and of the read groups on the simulated VISA backend, no instrument needed
+    SR830 and Lakeshore 340 share the GPIB board, the IPS 120-10 and the Model 430 have serial ports of their own
+        usage:  python -m elflab.examples.bench_sim_visa [number of measurements]
+"""
+import sys
+import time
+from elflab import kernels
+from elflab.devices import device_base, sim_visa
+from elflab.devices.lockins.stanford import SR830
+from elflab.devices.T_controllers.lakeshore import Lakeshore340
+from elflab.devices.magnets.oxford import IPS120_10
+from elflab.devices.magnets.ami import Model430
+
+N = 100     # measurements per benchmark
+
+def setup(jitter=0.001, error_rate=0.):
+    rm = sim_visa.ResourceManager(jitter=jitter, error_rate=error_rate, seed=0)
+    rm.add("GPIB::8", sim_visa.SR830Sim(), latency={None: 0.004, "SNAP?": 0.008})
+    rm.add("GPIB::12", sim_visa.Lakeshore340Sim(), latency=0.01)
+    rm.add("GPIB::25", sim_visa.IPS120Sim(), latency=0.015)
+    rm.add("ASRL5::INSTR", sim_visa.Model430Sim(), latency=0.02)
+    device_base.set_resource_manager(rm, sim_visa)
+
+    lockin = SR830(8)
+    lakeshore = Lakeshore340(12)
+    magnet = Model430("ASRL5::INSTR")
+    ips = IPS120_10(25)
+    for device in (lockin, lakeshore, magnet, ips):
+        device.connect()
+    return (lockin, lakeshore, magnet, ips)
+
+def bench(label, function, n):
+    t = time.perf_counter()
+    for i in range(n):
+        function()
+    dt = (time.perf_counter() - t) / n
+    print("    {:<40s}{:10.2f} ms / measurement".format(label, dt * 1000.))
+
+def main(n=N):
+    (lockin, lakeshore, magnet, ips) = setup()
+
+    def serial():
+        lockin.read()
+        lakeshore.read_many(("A", "B"))
+        magnet.read()
+
+    group = kernels.ReadGroup()
+    group.add("lockin", lockin.read)
+    group.add("T", lakeshore.read_many, ("A", "B"))
+    group.add("H", magnet.read)
+
+    print("Simulated instruments, {:d} measurements:".format(n))
+    bench("lockin", lockin.read, n)
+    bench("Lakeshore 340, two channels", lambda: lakeshore.read_many(("A", "B")), n)
+    bench("Model 430 (serial port)", magnet.read, n)
+    bench("IPS 120-10", ips.read, n)
+    bench("all three, one after another", serial, n)
+    bench("all three, in a read group", group.read, n)
+    print()
+    print(group.timings.report())
+    group.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N)
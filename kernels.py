@@ -6,16 +6,346 @@
 # Imports
 import os
 import time
+import math
 import multiprocessing
 import threading
 import random
-from elflab.plotters import plot_live
+import collections
+import contextlib
+import atexit
+import functools
+import asyncio
+import concurrent.futures
+import numpy as np
+from elflab.plotters import ring_buffer     # plot_live (and matplotlib) is only imported by the plotting process
+from elflab.dataloggers import log_worker
+from elflab.devices.device_base import interface_of, bus_lock, bus_locks, LockChain
 import elflab.abstracts
 
 # Constants
 # ____Caller can omit plotting timings, by using these default
 DEFAULT_PLOT_REFRESH_INTERVAL = 0.5     # Interval between plot refreshes in s
 DEFAULT_PLOT_LISTEN_INTERVAL = 0.05    # Interval between listening events in s
+# ____Scheduling of measurements
+DEFAULT_FIXED_RATE = True   # True: measure on absolute deadlines; False: sleep a full interval after each measurement
+DEFAULT_OVERRUN_POLICY = "skip"     # "skip" or "catch_up", see TickScheduler
+# ____Data logging
+DEFAULT_LOG_QUEUE_SIZE = log_worker.DEFAULT_QUEUE_SIZE  # maximum number of data points waiting to be logged
+DEFAULT_LOG_OVERFLOW = log_worker.BLOCK     # "block", "drop_oldest" or "spill", see dataloggers.log_worker
+# ____Data transport to the plotting process
+DEFAULT_PLOT_TRANSPORT = "shm" if ring_buffer.available() else "pipe"  # "shm": through a shared-memory ring buffer; "pipe": in blocks through the pipe, one per poll
+DEFAULT_PLOT_BUFFER_SIZE = ring_buffer.DEFAULT_CAPACITY    # data points kept in the ring buffer, or waiting for a poll
+DEFAULT_HEADLESS = False    # True: no plotting process until asked for with plot()
+# ____Timing statistics
+HISTOGRAM_MIN = 1e-7    # smallest latency resolved, in s
+HISTOGRAM_SUB_BUCKETS = 16     # buckets per factor of 2, i.e. a resolution of about 4.4%
+HISTOGRAM_OCTAVES = 40      # buckets span HISTOGRAM_MIN * 2**40, about 30 hours
+
+
+class LatencyHistogram:
+    """Counts latencies in logarithmic buckets (HDR-style): constant relative resolution over the whole range,
+    constant memory and O(1) recording, so it can stay on for overnight runs
+    Latencies above "limit" (if given) are counted as overruns"""
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.counts = [0] * (HISTOGRAM_SUB_BUCKETS * HISTOGRAM_OCTAVES + 2)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.n_overruns = 0
+    
+    def record(self, t):
+        if t < HISTOGRAM_MIN:
+            i = 0
+        else:
+            i = min(int(math.log2(t / HISTOGRAM_MIN) * HISTOGRAM_SUB_BUCKETS) + 1, len(self.counts) - 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += t
+        if t > self.max:
+            self.max = t
+        if (self.limit is not None) and (t > self.limit):
+            self.n_overruns += 1
+    
+    def percentile(self, q):
+        """the latency below which q percent of the records fall, to within the resolution of a bucket"""
+        if self.count == 0:
+            return float("nan")
+        rank = q / 100. * self.count
+        n = 0
+        for i, c in enumerate(self.counts):
+            n += c
+            if n >= rank and c > 0:
+                # upper edge of the bucket, but never beyond the largest record
+                return min(HISTOGRAM_MIN * 2 ** (i / HISTOGRAM_SUB_BUCKETS), self.max)
+        return self.max
+    
+    def summary(self):
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count > 0 else float("nan"),
+                "p50": self.percentile(50),
+                "p99": self.percentile(99),
+                "max": self.max,
+                "overruns": self.n_overruns
+                }
+
+
+class TimedCall:
+    """A function recording the time of each call in StageTimings
+    a class rather than a closure, so that it pickles with whatever holds it"""
+    def __init__(self, timings, name, function):
+        self.timings = timings
+        self.name = name
+        self.function = function
+    
+    def __call__(self, *args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            self.timings.record(self.name, time.perf_counter() - t)
+
+
+class StageTimings:
+    """A set of named LatencyHistograms, e.g. one per stage of the measurement cycle, or one per device"""
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.histograms = {}    # = {name: LatencyHistogram}, in the order first recorded
+    
+    def record(self, name, t):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram(self.limit)
+        self.histograms[name].record(t)
+    
+    def timed(self, name, function):
+        """returns function wrapped to record the time of each call under name"""
+        return TimedCall(self, name, function)
+    
+    @contextlib.contextmanager
+    def timing(self, name):
+        """records the time of the block under name, e.g. for a device read made directly in an experiment's measure():
+            with self.timings.timing("lockin1"):
+                reading = self.lockin1.read()"""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t)
+    
+    def reset(self):
+        self.histograms = {}
+    
+    def stats(self):    # = {name: summary of the histogram}
+        return {name: h.summary() for (name, h) in list(self.histograms.items())}
+    
+    def report(self, indent="        "):
+        lines = ["{}{:<28}{:>10}{:>12}{:>12}{:>12}{:>12}{:>10}".format(indent, "", "count", "mean/s", "p50/s", "p99/s", "max/s", "overruns")]
+        for name, m in self.stats().items():
+            lines.append("{}{:<28}{:>10d}{:>12.3g}{:>12.3g}{:>12.3g}{:>12.3g}{:>10d}".format(
+                indent, name, m["count"], m["mean"], m["p50"], m["p99"], m["max"], m["overruns"]))
+        return "\n".join(lines)
+
+
+class ReadGroup:
+    """A declarative group of independent device reads, to be issued concurrently within one measurement
+    Reads on the same interface (e.g. the GPIB board) are serialised in one worker thread,
+    reads on different interfaces proceed in parallel, so a cycle costs about the slowest interface
+        usage:  group.add("T_A", lakeshore.read, "A")
+                readings = group.read()     # = {"T_A": (t, T), ...}
+    """
+    def __init__(self):
+        self.reads = {}     # = {key: (interface, function, args)}, in the order added
+        self.executors = {}     # = {interface: single-worker thread pool}
+        self.timings = StageTimings()   # latency of each read, and of each interface per measurement
+
+    def add(self, key, function, *args, interface=None):
+        # function: usually a bound method of a device, whose address defines the interface
+        if interface is None:
+            interface = interface_of(getattr(function, "__self__", None))
+        self.reads[key] = (interface, function, args)
+
+    # Execute a list of reads one after another, on the calling thread
+    def read_serial(self, jobs):
+        readings = {}
+        for (key, function, args) in jobs:
+            t = time.perf_counter()
+            readings[key] = function(*args)
+            self.timings.record(key, time.perf_counter() - t)
+        return readings
+    
+    # Execute the reads of one interface, and time them together
+    def read_interface(self, interface, jobs):
+        t = time.perf_counter()
+        with bus_lock(interface):
+            readings = self.read_serial(jobs)
+        self.timings.record("[{}]".format(interface), time.perf_counter() - t)
+        return readings
+
+    def read(self, keys=None):
+        """issue the reads (all of them if keys is None) and wait for all to complete
+        returns {key: return value of the read}"""
+        if keys is None:
+            keys = self.reads.keys()
+        # Sort the reads by interfaces
+        jobs = {}
+        for key in keys:
+            interface, function, args = self.reads[key]
+            if interface not in jobs:
+                jobs[interface] = []
+            jobs[interface].append((key, function, args))
+        if len(jobs) == 0:
+            return {}
+        # Hand all but one interface to the workers, and do the last one on this thread
+        interfaces = list(jobs.keys())
+        futures = []
+        for interface in interfaces[:-1]:
+            if interface not in self.executors:
+                self.executors[interface] = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            futures.append(self.executors[interface].submit(self.read_interface, interface, jobs[interface]))
+        try:
+            readings = self.read_interface(interfaces[-1], jobs[interfaces[-1]])
+        finally:
+            # never leave a read in flight, even if ours failed
+            concurrent.futures.wait(futures)
+        for f in futures:
+            readings.update(f.result())
+        return readings
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        self.executors = {}
+
+
+class TickScheduler:
+    """Schedules measurements on absolute deadlines t0 + n*interval, so the period does not drift
+    with the measurement and logging time
+    On an overrun (a measurement finishing after its next deadline), the policy decides:
+        "skip":     drop the missed ticks, and resume on the next deadline in the future
+        "catch_up": start the following measurements immediately, until back on schedule
+    Overruns are counted, and the lateness of each tick is recorded as the jitter"""
+    SKIP = "skip"
+    CATCH_UP = "catch_up"
+    
+    def __init__(self, interval, fixed_rate=DEFAULT_FIXED_RATE, policy=DEFAULT_OVERRUN_POLICY):
+        if policy not in (self.SKIP, self.CATCH_UP):
+            raise ValueError("[TickScheduler] unknown overrun policy: \"{}\"".format(policy))
+        self.interval = interval
+        self.fixed_rate = fixed_rate and (interval > 0)   # an interval of 0 runs free, e.g. paced by the experiment's sequence
+        self.policy = policy
+        self.start()
+    
+    def start(self):
+        self.t_start = self.next_tick = time.perf_counter()
+        self.n_ticks = 0
+        self.n_overruns = 0
+        self.n_skipped = 0
+        # jitter statistics, in s
+        self.jitter_sum = 0.
+        self.jitter_sum2 = 0.
+        self.jitter_max = 0.
+    
+    # To be called at the start of each measurement
+    def tick(self):
+        self.n_ticks += 1
+        if self.fixed_rate:
+            jitter = time.perf_counter() - self.next_tick
+            self.jitter_sum += jitter
+            self.jitter_sum2 += jitter * jitter
+            if jitter > self.jitter_max:
+                self.jitter_max = jitter
+    
+    # Advance to the next deadline, and return how long to wait for it in s
+    def delay(self):
+        if not self.fixed_rate:
+            return self.interval
+        self.next_tick += self.interval
+        now = time.perf_counter()
+        if now > self.next_tick:
+            self.n_overruns += 1
+            if self.policy == self.SKIP:
+                missed = int((now - self.next_tick) // self.interval) + 1 if self.interval > 0 else 0
+                self.n_skipped += missed
+                self.next_tick += missed * self.interval
+        return max(self.next_tick - time.perf_counter(), 0.)
+    
+    # Sleep until the next deadline
+    def wait(self):
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+    
+    # Re-synchronise after an intentional break (e.g. a pause), without counting it as an overrun
+    def reset(self):
+        self.next_tick = time.perf_counter()
+    
+    def rate(self):     # achieved measurements per second
+        elapsed = time.perf_counter() - self.t_start
+        return self.n_ticks / elapsed if elapsed > 0 else float("nan")
+    
+    def report(self):
+        if self.n_ticks > 0 and self.fixed_rate:
+            mean = self.jitter_sum / self.n_ticks
+            rms = (self.jitter_sum2 / self.n_ticks) ** 0.5
+        else:
+            mean = rms = float("nan")
+        return "{:d} measurements at {:.4g} /s (target {:.4g} /s), {:d} overruns, {:d} ticks skipped; jitter: mean={:.3g} s, rms={:.3g} s, max={:.3g} s".format(
+                self.n_ticks, self.rate(), 1. / self.interval if self.interval > 0 else float("inf"),
+                self.n_overruns, self.n_skipped, mean, rms, self.jitter_max)
+
+
+class RateGroups:
+    """Decides which rate groups of an experiment are due at each tick, see ExperimentBase.rate_groups
+    and keeps the time stamp of the last measurement of each group; the values themselves are carried forward in the experiment's current_values
+    which also get the age of each group's values (see age_variables), if the experiment has the variables"""
+    TICKS = "ticks"
+    SECONDS = "s"
+    AGE_PREFIX = "age_"     # "age_<group>": time since the group was last measured, in s
+    
+    def __init__(self, rate_groups):
+        for group, (every, unit) in rate_groups.items():
+            if unit not in (self.TICKS, self.SECONDS):
+                raise ValueError("[RateGroups] unknown unit \"{}\" for the rate group \"{}\"".format(unit, group))
+        self.rate_groups = rate_groups
+        self.start()
+    
+    def start(self):
+        self.last_ticks = {group: None for group in self.rate_groups}
+        self.timestamps = {group: float("nan") for group in self.rate_groups}  # perf_counter() of the last measurement of each group
+    
+    def due(self, tick, now):
+        groups = []
+        for group, (every, unit) in self.rate_groups.items():
+            if self.last_ticks[group] is None:
+                groups.append(group)
+            elif unit == self.TICKS:
+                if tick - self.last_ticks[group] >= every:
+                    groups.append(group)
+            elif now - self.timestamps[group] >= every:
+                groups.append(group)
+        return groups
+    
+    # To be called once the groups have been measured
+    def done(self, groups, tick, now):
+        for group in groups:
+            self.last_ticks[group] = tick
+            self.timestamps[group] = now
+    
+    def ages(self, now=None):     # time since the last measurement of each group, in s
+        if now is None:
+            now = time.perf_counter()
+        return {group: now - t for (group, t) in self.timestamps.items()}
+    
+    @classmethod
+    def age_variables(cls, rate_groups):    # = {variable: group}, for an experiment to log the ages
+        return {cls.AGE_PREFIX + group: group for group in rate_groups}
+    
+    def write_ages(self, values, now):  # into the variables of values (current_values) named by age_variables(), if present
+        ages = self.ages(now)
+        for (var, group) in self.age_variables(self.rate_groups).items():
+            if var in values:
+                values[var] = ages[group]
+
 
 class DummyKernel(elflab.abstracts.KernelBase):
     """A Kernel that does nothing"""
@@ -42,6 +372,10 @@ class DummyKernel(elflab.abstracts.KernelBase):
         pass
     def clearPlot(self):
         pass
+    def stats(self):
+        return {}
+    def showStats(self):
+        pass
 
         
 
@@ -52,6 +386,7 @@ class Galileo(elflab.abstracts.KernelBase):
     title = "Galileo"
     PROMPT = r"?>"
     UI_LAG = 0.3
+    PAUSE_INTERVAL = 0.01   # minimum interval between checks for resuming, in s
     
     # ____Help information
     with open(os.path.join(os.path.dirname(__file__), "misc", "galileo_help_info.txt"), "r") as inpFile:
@@ -62,7 +397,7 @@ class Galileo(elflab.abstracts.KernelBase):
             QUESTIONS.append(line.strip())
       
 
-    def __init__(self, experiment, plot_refresh_interval=DEFAULT_PLOT_REFRESH_INTERVAL, plot_listen_interval=DEFAULT_PLOT_LISTEN_INTERVAL, data_lock=None, instrument_lock=None):
+    def __init__(self, experiment, plot_refresh_interval=DEFAULT_PLOT_REFRESH_INTERVAL, plot_listen_interval=DEFAULT_PLOT_LISTEN_INTERVAL, data_lock=None, instrument_lock=None, fixed_rate=DEFAULT_FIXED_RATE, overrun_policy=DEFAULT_OVERRUN_POLICY, log_queue_size=DEFAULT_LOG_QUEUE_SIZE, log_overflow=DEFAULT_LOG_OVERFLOW, plot_transport=DEFAULT_PLOT_TRANSPORT, plot_buffer_size=DEFAULT_PLOT_BUFFER_SIZE, headless=DEFAULT_HEADLESS):
               # (self, Experiment object, XYs for the sub-plots, ...) 
         print("    [Galileo:] Initialising Galileo......")
         # set flags
@@ -75,10 +410,31 @@ class Galileo(elflab.abstracts.KernelBase):
         self.measurement_interval = experiment.measurement_interval
         self.plotXYs = experiment.plotXYs
         
+        # Headless: start measuring without a plotting process, a viewer can be attached later with plot()
+        self.headless = headless
+        self.plotProc = None
+        self.measureThread = None
+        
         # ____the timing "constants", all in seconds
         self.plot_refresh_interval = plot_refresh_interval
         self.plot_listen_interval = plot_listen_interval
         
+        # Scheduling of measurements
+        self.scheduler = TickScheduler(self.measurement_interval, fixed_rate=fixed_rate, policy=overrun_policy)
+        
+        # Polling rates of the experiment, if any
+        if experiment.rate_groups is None:
+            self.rateGroups = None
+        else:
+            self.rateGroups = RateGroups(experiment.rate_groups)
+        
+        # Timing of the stages of each measurement cycle, anything slower than the interval counts as an overrun
+        self.timings = StageTimings(limit=self.measurement_interval if self.measurement_interval > 0 else None)
+        self.timedLog = self.timings.timed("log write", experiment.log)
+        
+        # Data logging, in a long-lived worker thread
+        self.logWorker = log_worker.LogWorker(self.timedLog, maxsize=log_queue_size, overflow=log_overflow, name="Galileo:data-logging")
+        
         # Save and calculate plotting informations
         self.NROWS = len(self.plotXYs)
         self.NCOLS = len(self.plotXYs[0])
@@ -92,6 +448,23 @@ class Galileo(elflab.abstracts.KernelBase):
                     plotLabels[i][j].append(experiment.var_titles[self.plotXYs[i][j][k]])
         self.plotLabels = plotLabels
         
+        # Variables plotted, in order of first appearance
+        self.plotVars = []
+        for row in self.plotXYs:
+            for xy in row:
+                for var in xy:
+                    if var not in self.plotVars:
+                        self.plotVars.append(var)
+        
+        # the shared-memory transport of plotting data, if any, is created by start()
+        if plot_transport not in ("shm", "pipe"):
+            raise ValueError("[Galileo] unknown plot transport: \"{}\"".format(plot_transport))
+        self.plot_transport = plot_transport
+        self.ring = None
+        self.plot_buffer_size = plot_buffer_size
+        # ____plotColumns[i, j, k] = index in plotVars of the k-th variable of sub-plot(i, j)
+        self.plotColumns = np.array([[[self.plotVars.index(xy[k]) for k in (0, 1)] for xy in row] for row in self.plotXYs], dtype=int)
+        
         # initialize the pipes and locks
         self.plotConn, self.mainConn = multiprocessing.Pipe(duplex=False)
         self.pipe_lock = multiprocessing.Lock()
@@ -104,70 +477,149 @@ class Galileo(elflab.abstracts.KernelBase):
         if instrument_lock is None:
             self.instrument_lock = multiprocessing.Lock()
         else:
-            self.instrument_lock = data_lock
+            self.instrument_lock = instrument_lock
+        # An experiment locking each bus for its own reads is measured without the global lock,
+        # and whoever still uses the global lock (e.g. an older controller) locks every bus instead,
+        # after the lock passed by the caller, which others (e.g. the GUI) may still share
+        if experiment.bus_locking:
+            if instrument_lock is None:
+                self.instrument_lock = bus_locks.all()
+            else:
+                self.instrument_lock = LockChain(instrument_lock, bus_locks.all())
         
         # Initialise RNG
         random.seed()
        
        
     def keepMeasuring(self, mainConn, pipe_lock, data_lock, instrument_lock):
-        # Start and finish a dummy thread
-        logThread = threading.Thread(target=None)
-        logThread.start()
+        # Start the data-logging worker
+        self.logWorker.start()
         
-        # Initialize plotting data
-        xys = []        # the container to blow to the plotting service
-        for i in range(self.NROWS):
-            xys.append([])
-            for j in range(self.NCOLS):
-                xys[i].append([])
-                for k in (0, 1):
-                    xys[i][j].append(0.)        
+        # Data points waiting for the next poll of the plotting service, in the order of plotVars
+        pending = collections.deque(maxlen=self.plot_buffer_size)
         
         # Measure
+        self.scheduler.start()
+        if self.rateGroups is not None:
+            self.rateGroups.start()
         for token in self.experiment.sequence():
             if not self.flag_stop:
-                with instrument_lock:
-                    self.experiment.measure()   # Take a measurement
-                
-                # Wait for any data logging to finish
-                logThread.join()
+                self.scheduler.tick()
+                t0 = time.perf_counter()
+                self.takeMeasurement(instrument_lock)
                 
-                # start another logging thread
+                # Queue the data point for logging
+                t1 = time.perf_counter()
                 with data_lock:
                     self.current_values = self.experiment.current_values.copy()
-                logThread = threading.Thread(target=self.experiment.log, name="Galileo:data-logging", kwargs={"dataToLog":self.current_values})
-                logThread.start()
+                self.logWorker.put(self.current_values)
                 
-                # Blow data to the plotting service only if requested
-                if self.plotStatus["request_data"].is_set():
-                    # Blow data
-                    with data_lock:
-                        for i in range(self.NROWS):
-                            for j in range(self.NCOLS):
-                                for k in (0, 1):
-                                    xys[i][j][k] = self.experiment.current_values[self.plotXYs[i][j][k]]
-                    with pipe_lock:
-                        mainConn.send(("data", xys))
-                    self.plotStatus["request_data"].clear()
+                t2 = time.perf_counter()
+                self.publishPlot(pending, mainConn, pipe_lock)
+                t3 = time.perf_counter()
+                self.timings.record("log queue", t2 - t1)
+                self.timings.record("plot", t3 - t2)
+                self.timings.record("cycle", t3 - t0)
             # Pause if asked to
-            while self.flag_pause and not self.flag_stop:
-                time.sleep(self.measurement_interval)
+            if self.flag_pause and not self.flag_stop:
+                while self.flag_pause and not self.flag_stop:
+                    time.sleep(max(self.measurement_interval, self.PAUSE_INTERVAL))
+                self.scheduler.reset()
             # Check whether to stop now.
             if self.flag_stop:
                 break
             else:
-                time.sleep(self.measurement_interval)
+                t = time.perf_counter()
+                self.scheduler.wait()
+                self.timings.record("sleep", time.perf_counter() - t)
                 
         # Now the flag_stop must have been triggered, finishing up
-        logThread.join()
+        self.logWorker.finish()     # Log whatever is still queued
         self.experiment.finish()  # Finish up any loose ends
         # Print messages
+        print("\n    [Galileo:] Scheduling: {}".format(self.scheduler.report()))
+        print("    [Galileo:] Data logging: {}".format(self.logWorker.report()))
         print("\n    [Galileo:] Measurements have been terminated. Enter \"quit\" to quit Galileo.\n")
         self.prompt()
         
         
-    def plottingProc(self, **kwargs):
+    def takeMeasurement(self, instrument_lock):
+        if self.experiment.bus_locking:
+            instrument_lock = contextlib.nullcontext()
+        t0 = time.perf_counter()
+        with instrument_lock:
+            t1 = time.perf_counter()
+            if self.rateGroups is None:
+                self.experiment.measure()   # Take a measurement
+            else:
+                # Measure only the rate groups due
+                groups = self.rateGroups.due(self.scheduler.n_ticks, t1)
+                self.experiment.measure_groups(groups)
+                self.rateGroups.done(groups, self.scheduler.n_ticks, t1)
+                self.rateGroups.write_ages(self.experiment.current_values, t1)
+            t2 = time.perf_counter()
+        self.timings.record("lock wait", t1 - t0)
+        self.timings.record("measure", t2 - t1)
+    
+    # Hand the latest data point (self.current_values) to the plotting service
+    def publishPlot(self, pending, mainConn, pipe_lock):
+        # Every point goes to the ring buffer, if there is one
+        point = [self.current_values[var] for var in self.plotVars]
+        if self.ring is not None:
+            self.ring.append(point)
+        else:
+            # Otherwise collect the points, and blow them as one block when the plotting service asks
+            pending.append(point)
+            if self.plotStatus["request_data"].is_set():
+                # block[i, j, k, :] = values of the k-th variable of sub-plot(i, j)
+                block = np.array(pending, dtype=float).T[self.plotColumns]
+                pending.clear()
+                with pipe_lock:
+                    mainConn.send(("data", block))
+                self.plotStatus["request_data"].clear()
+        
+    # The ReadGroups of the experiment, whose reads are timed per device
+    def readGroups(self):
+        return [attr for attr in vars(self.experiment).values() if isinstance(attr, ReadGroup)]
+    
+    # The StageTimings of the experiment, timing the device reads it makes directly (see StageTimings.timing)
+    def readTimings(self):
+        return [attr for attr in vars(self.experiment).values() if isinstance(attr, StageTimings)]
+    
+    def stats(self):
+        """timing statistics of the measurements, every latency summarised as {"count", "mean", "p50", "p99", "max", "overruns"} in s
+        returns {"stages": {stage: summary}, "devices": {read: summary}, "scheduling": {...}, "logging": {...}}"""
+        devices = {}
+        for group in self.readGroups():
+            devices.update(group.timings.stats())
+        for timings in self.readTimings():
+            devices.update(timings.stats())
+        return {"stages": self.timings.stats(),
+                "devices": devices,
+                "scheduling": {"measurements": self.scheduler.n_ticks,
+                               "rate": self.scheduler.rate(),
+                               "overruns": self.scheduler.n_overruns,
+                               "skipped": self.scheduler.n_skipped},
+                "logging": self.logWorker.metrics()
+                }
+    
+    def showStats(self):
+        print("    [Galileo:] Scheduling: {}".format(self.scheduler.report()))
+        print("    [Galileo:] Stages of the measurement cycle (overruns: slower than the interval of {:.4g} s):".format(self.measurement_interval))
+        print(self.timings.report())
+        for group in self.readGroups():
+            print("    [Galileo:] Device reads, [interface] = all reads on the interface in one measurement:")
+            print(group.timings.report())
+        for timings in self.readTimings():
+            print("    [Galileo:] Device reads:")
+            print(timings.report())
+        print("")
+        self.prompt()
+    
+    # The target of the plotting process: static, so that starting it (by spawning, on Windows) pickles its arguments only, not the kernel
+    @staticmethod
+    def plottingProc(**kwargs):
+        from elflab.plotters import plot_live
         pl = plot_live.PlotLive(**kwargs)
         pl.start()         
     
@@ -209,17 +661,27 @@ class Galileo(elflab.abstracts.KernelBase):
         print("    [Galileo:] Terminating data plotting......\n")
         with self.pipe_lock:
             self.flag_quit = True
-            self.mainConn.send(("quit", []))
-        self.plotProc.join(1)
-        if self.plotProc.is_alive():
-            print("    [Galileo:] WARNING: Data plotting time-out, forcibly terminating......\n")
-            with self.pipe_lock:
-                self.plotProc.terminate()
+            if self.plotProc is not None:
+                self.mainConn.send(("quit", []))
+        if self.plotProc is not None:
+            self.plotProc.join(1)
+            if self.plotProc.is_alive():
+                print("    [Galileo:] WARNING: Data plotting time-out, forcibly terminating......\n")
+                with self.pipe_lock:
+                    self.plotProc.terminate()
+        self.releaseRing()
         print("    [Galileo:] Live plotting service is terminated.\n")
         print("    [Galileo:] Yet it moves.\n") 
         
     def plot(self):
-        if self.plotStatus["plot_shown"].is_set():
+        if self.plotProc is None:
+            # Headless so far: attach a viewer, it picks up the data still in the plotting buffer
+            self.startPlotting()
+            print("    [Galileo:] Waiting for a plot window to open......")
+            self.plotStatus["plot_shown"].wait()
+            time.sleep(self.UI_LAG)
+            print("    [Galileo:] A plot window should have opened.\n")
+        elif self.plotStatus["plot_shown"].is_set():
             print("    [Galileo:] WARNING: A plot window should had already been open. Command ignored.")
         else:
             self.plotStatus["command_done"].clear()
@@ -232,6 +694,9 @@ class Galileo(elflab.abstracts.KernelBase):
         self.prompt()
             
     def autoscaleOn(self):
+        if self.plotProc is None:
+            self.noPlotting()
+            return
         self.plotStatus["command_done"].clear()
         print("    [Galileo:] Turning auto-scale on......")
         with self.pipe_lock:
@@ -242,6 +707,9 @@ class Galileo(elflab.abstracts.KernelBase):
         self.prompt()
         
     def autoscaleOff(self):    
+        if self.plotProc is None:
+            self.noPlotting()
+            return
         self.plotStatus["command_done"].clear()
         print("    [Galileo:] Turning auto-scale off......")
         with self.pipe_lock:
@@ -252,6 +720,9 @@ class Galileo(elflab.abstracts.KernelBase):
         self.prompt()
         
     def clearPlot(self):
+        if self.plotProc is None:
+            self.noPlotting()
+            return
         self.plotStatus["command_done"].clear()
         print("    [Galileo:] Clearing plotting buffer......")
         with self.pipe_lock:
@@ -261,6 +732,10 @@ class Galileo(elflab.abstracts.KernelBase):
         print("    [Galileo:] Done.\n")
         self.prompt()
     
+    def noPlotting(self):
+        print("    [Galileo:] WARNING: Running headless, no plot window is open. Enter \"plot\" to open one.")
+        self.prompt()
+    
     def wrongCommand(self, command):
         print("    [Galileo:] WARNING: Unrecognised command: \"{}\".\n".format(command))
         self.prompt()
@@ -270,11 +745,32 @@ class Galileo(elflab.abstracts.KernelBase):
 
 
         
+    # Shared memory outlives the process unless unlinked: freed by quit(), by a failed start(), or at exit if neither happens
+    def createRing(self):
+        if self.plot_transport == "shm":
+            self.ring = ring_buffer.SharedRingBuffer(self.plotVars, capacity=self.plot_buffer_size)
+            atexit.register(self.releaseRing)
+    
+    def releaseRing(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+            atexit.unregister(self.releaseRing)
+    
     def start(self):
+        try:
+            self.createRing()
+            self.startMeasuring()
+        except BaseException:
+            if self.measureThread is None:  # nothing reads or writes the ring yet
+                if self.plotProc is not None:
+                    self.plotProc.terminate()
+                self.releaseRing()
+            raise
+    
+    def startMeasuring(self):
         self.flag_stop = False
-        # Start the plotting service
-        print("    [Galileo:] Starting the live data plotting service......")
-        
         # Initialize the plot status indicators and send through the pipe
         self.plotStatus = {"plot_shown": multiprocessing.Event(),
                            "command_done": multiprocessing.Event(),
@@ -283,6 +779,34 @@ class Galileo(elflab.abstracts.KernelBase):
         self.plotStatus["plot_shown"].clear()
         self.plotStatus["command_done"].clear()
         self.plotStatus["request_data"].clear()
+        
+        if self.headless:
+            print("    [Galileo:] Running headless: no live data plotting until \"plot\" is entered.\n")
+        else:
+            self.startPlotting()
+        
+                # start the experiment
+        print("""\
+        starting the following experiment:
+            +----------------------------------------+
+            |{0:^40}|
+            +----------------------------------------+\n""".format(self.experiment.title))
+            
+        self.experiment.start()
+        
+        self.measureThread = threading.Thread(target=self.keepMeasuring, name="Galileo: Measurements", args=(self.mainConn, self.pipe_lock, self.data_lock, self.instrument_lock))
+        self.measureThread.start()
+        
+        if self.headless:
+            print("    [Galileo:] Measurements have started.\n")
+        else:
+            print ("    [Galileo:] Measurements have started.\n\n    [Galileo:] Waiting for a plot window to open......")
+            self.plotStatus["plot_shown"].wait() 
+        self.prompt()
+    
+    def startPlotting(self):
+        # Start the plotting service
+        print("    [Galileo:] Starting the live data plotting service......")
         self.plotProc = multiprocessing.Process(target=self.plottingProc, name="Galileo: Data plotting",
                                            kwargs={"status": self.plotStatus,
                                                    "plotConn": self.plotConn,
@@ -290,6 +814,7 @@ class Galileo(elflab.abstracts.KernelBase):
                                                    "xyLabels": self.plotLabels,
                                                    "refreshInterval": self.plot_refresh_interval,
                                                    "listenInterval": self.plot_listen_interval,
+                                                   "ringSpec": None if self.ring is None else self.ring.spec(),
                                                    }
                                            )
 
@@ -297,19 +822,191 @@ class Galileo(elflab.abstracts.KernelBase):
         # Wait for the plotting service to give its first data inquiring signal
         self.plotStatus["request_data"].wait()
         print("    [Galileo:] Live data plotting service has started.\n")
+
+
+
+class HeadlessGalileo(Galileo):
+    """Galileo for unattended runs from scripts: no plotting process (nor matplotlib) until "plot" is entered"""
+    title = "Galileo (headless)"
+    
+    def __init__(self, experiment, **kwargs):
+        kwargs.setdefault("headless", True)
+        super().__init__(experiment, **kwargs)
+
+
+class AsyncDevice:
+    """Wraps a device for an AsyncGalileo kernel: calling any of its methods returns an awaitable,
+    executed on the long-lived thread of the device's interface, e.g. t, T = await kernel.device(lakeshore).read("A")"""
+    def __init__(self, device, kernel):
+        self.device = device
+        self.kernel = kernel
+        self.interface = interface_of(device)
+        self.name = type(device).__name__
+    
+    def __getattr__(self, name):
+        attr = getattr(self.device, name)
+        if not callable(attr):
+            return attr
+        timed = self.kernel.deviceTimings.timed("{}.{}".format(self.name, name), attr)
+        lock = bus_lock(self.interface)
+        def locked(*args, **kwargs):
+            with lock:
+                return timed(*args, **kwargs)
+        def call(*args, **kwargs):
+            return self.kernel.run_blocking(functools.partial(locked, *args, **kwargs), self.interface)
+        return call
+
+
+class AsyncGalileo(Galileo):
+    """Galileo on a single asyncio event loop
+    Measurement ticks, plotting data and controller tasks are all coroutines sharing one scheduler,
+    blocking (VISA) calls are executed on one long-lived thread per interface, instead of threads per call,
+    and data are logged by the LogWorker thread, as in Galileo
+    An experiment may define a coroutine measure_async(kernel) to issue its reads concurrently through kernel.device(),
+    otherwise its measure() / measure_groups() is executed on a worker thread"""
+    title = "Galileo (asyncio)"
+    MEASURE_INTERFACE = "measure"   # executor keys for work not tied to a device
+    LOG_INTERFACE = "logging"
+    CONTROL_INTERFACE = "control"
+    
+    def __init__(self, experiment, **kwargs):
+        super().__init__(experiment, **kwargs)
+        self.loop = None
+        self.executors = {}     # = {interface: single-worker thread pool}
+        self.deviceTimings = StageTimings()     # calls through device()
+    
+    # ____Services to experiments and controllers
+    def executor(self, interface):
+        if interface not in self.executors:
+            self.executors[interface] = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return self.executors[interface]
+    
+    def run_blocking(self, function, interface=MEASURE_INTERFACE):
+        """run function() on the thread of the interface, returns an awaitable; call from the event loop only"""
+        return self.loop.run_in_executor(self.executor(interface), function)
+    
+    def device(self, device):
+        return AsyncDevice(device, self)
+    
+    def is_running(self):
+        return (self.loop is not None) and self.loop.is_running()
+    
+    def call_soon(self, coroutine):
+        """schedule a coroutine on the event loop from any thread, returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+    
+    def run_periodic(self, interval, function, interface=CONTROL_INTERFACE):
+        """call function() every interval seconds on the event loop's scheduler until it returns False, or the Future returned is cancelled
+        returns None if the event loop is not running (the caller should fall back to its own thread)"""
+        if not self.is_running():
+            return None
+        async def periodic():
+            while True:
+                await asyncio.sleep(interval)
+                if (await self.run_blocking(function, interface)) is False:
+                    break
+        return self.call_soon(periodic())
+    
+    def stats(self):
+        stats = super().stats()
+        stats["devices"].update(self.deviceTimings.stats())
+        return stats
+    
+    def showStats(self):
+        if len(self.deviceTimings.histograms) > 0:
+            print("    [Galileo:] Device calls through the event loop:")
+            print(self.deviceTimings.report())
+        super().showStats()
+    
+    # ____The event loop
+    def keepMeasuring(self, mainConn, pipe_lock, data_lock, instrument_lock):
+        # Start the data-logging worker
+        self.logWorker.start()
         
-                # start the experiment
-        print("""\
-        starting the following experiment:
-            +----------------------------------------+
-            |{0:^40}|
-            +----------------------------------------+\n""".format(self.experiment.title))
-            
-        self.experiment.start()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.measureLoop(mainConn, pipe_lock, data_lock, instrument_lock))
+            # Let the controller tasks wind down
+            tasks = [task for task in asyncio.all_tasks(self.loop) if not task.done()]
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        finally:
+            self.loop.close()
+            for executor in self.executors.values():
+                executor.shutdown(wait=True)
+            self.executors = {}
         
-        self.measureThread = threading.Thread(target=self.keepMeasuring, name="Galileo: Measurements", args=(self.mainConn, self.pipe_lock, self.data_lock, self.instrument_lock))
-        self.measureThread.start()
+        self.logWorker.finish()     # Log whatever is still queued
+        self.experiment.finish()  # Finish up any loose ends
+        # Print messages
+        print("\n    [Galileo:] Scheduling: {}".format(self.scheduler.report()))
+        print("    [Galileo:] Data logging: {}".format(self.logWorker.report()))
+        print("\n    [Galileo:] Measurements have been terminated. Enter \"quit\" to quit Galileo.\n")
+        self.prompt()
+    
+    # Hand a data point to the LogWorker, waiting on a worker thread rather than on the event loop if it blocks when full
+    async def queueLog(self, dataToLog):
+        if (self.logWorker.overflow == log_worker.BLOCK) and self.logWorker.full():
+            await self.run_blocking(functools.partial(self.logWorker.put, dataToLog), self.LOG_INTERFACE)
+        else:
+            self.logWorker.put(dataToLog)
+    
+    # Take the global instrument lock for measure_async, acquired and released on the same worker thread
+    async def measureLocked(self, instrument_lock):
+        await self.run_blocking(instrument_lock.acquire)
+        t1 = time.perf_counter()
+        try:
+            await self.experiment.measure_async(self)
+        finally:
+            await self.run_blocking(instrument_lock.release)
+        return t1
+    
+    async def measureLoop(self, mainConn, pipe_lock, data_lock, instrument_lock):
+        # Data points waiting for the next poll of the plotting service, in the order of plotVars
+        pending = collections.deque(maxlen=self.plot_buffer_size)
         
-        print ("    [Galileo:] Measurements have started.\n\n    [Galileo:] Waiting for a plot window to open......")
-        self.plotStatus["plot_shown"].wait() 
-        self.prompt()
\ No newline at end of file
+        # Measure
+        self.scheduler.start()
+        if self.rateGroups is not None:
+            self.rateGroups.start()
+        for token in self.experiment.sequence():
+            if not self.flag_stop:
+                self.scheduler.tick()
+                t0 = time.perf_counter()
+                if hasattr(self.experiment, "measure_async"):
+                    if self.experiment.bus_locking:     # device() calls lock their buses
+                        t1 = t0
+                        await self.experiment.measure_async(self)
+                    else:
+                        t1 = await self.measureLocked(instrument_lock)
+                        self.timings.record("lock wait", t1 - t0)
+                    self.timings.record("measure", time.perf_counter() - t1)
+                else:
+                    await self.run_blocking(functools.partial(self.takeMeasurement, instrument_lock))
+                
+                # Queue the data point for logging
+                t1 = time.perf_counter()
+                with data_lock:
+                    self.current_values = self.experiment.current_values.copy()
+                await self.queueLog(self.current_values)
+                
+                t2 = time.perf_counter()
+                self.publishPlot(pending, mainConn, pipe_lock)
+                t3 = time.perf_counter()
+                self.timings.record("log queue", t2 - t1)
+                self.timings.record("plot", t3 - t2)
+                self.timings.record("cycle", t3 - t0)
+            # Pause if asked to
+            if self.flag_pause and not self.flag_stop:
+                while self.flag_pause and not self.flag_stop:
+                    await asyncio.sleep(max(self.measurement_interval, self.PAUSE_INTERVAL))
+                self.scheduler.reset()
+            # Check whether to stop now.
+            if self.flag_stop:
+                break
+            else:
+                t = time.perf_counter()
+                await asyncio.sleep(self.scheduler.delay())
+                self.timings.record("sleep", time.perf_counter() - t)
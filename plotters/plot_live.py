@@ -13,6 +13,7 @@ import matplotlib.animation as animation
 import time
 import threading
 import multiprocessing
+from elflab.plotters import ring_buffer
 
 class PlotLive:
     """ Implementation of plotting live data from measurements"""
@@ -39,8 +40,8 @@ class PlotLive:
         
         
     # The constructor
-    def __init__(self, status, plotConn, xyVars, xyLabels, refreshInterval=DEFAULT_PERIOD, listenInterval=DEFAULT_PERIOD):
-                # self, (one end of a Pipe), process lock,, (list of variables to plot in each subplots), (list of labels), refresh interval in s, sampling interval in s
+    def __init__(self, status, plotConn, xyVars, xyLabels, refreshInterval=DEFAULT_PERIOD, listenInterval=DEFAULT_PERIOD, ringSpec=None):
+                # self, (one end of a Pipe), process lock,, (list of variables to plot in each subplots), (list of labels), refresh interval in s, sampling interval in s, (names, capacity, shared memory name) of a SharedRingBuffer carrying the data, or None if data come through the pipe
         
         # Save constants
         self.status = status
@@ -77,6 +78,14 @@ class PlotLive:
         self.xyLims[:,:,:,0].fill(float("inf"))
         self.xyLims[:,:,:,1].fill(float("-inf"))
         
+        # Attach to the shared-memory ring buffer, and map its columns onto the sub-plots
+        if ringSpec is None:
+            self.ring = None
+        else:
+            self.ring = ring_buffer.SharedRingBuffer(*ringSpec)
+            self.ringIndex = 0
+            self.ringColumns = np.array([[[self.ring.names.index(xyVars[i][j][k]) for k in (0, 1)] for j in range(ncols)] for i in range(nrows)], dtype=int)
+        
         # Initialize listener threading
         self.dataLock = threading.RLock()
         self.listenThread = threading.Thread(target = self.listen, name = "Galileo: plot listener")
@@ -120,49 +129,56 @@ class PlotLive:
                         self.nPoints = 2
                         self.status["command_done"].set()
                     elif command == "data":
-                        # Store data in buffer
-                        self.nPoints += 1
-                        # ____Check buffer size
-                        if self.nPoints > self.maxPoints:
-                            # Down-sampling old data
-                            if DEBUG_INFO:
-                                print("[DEBUG: LivePlot] Plotting buffer full, down-sampling.")
-                            self.nPoints = self.maxPoints // self.DOWNSAMPLERATIO
-                            for i in range(self.nPoints):
-                                self.xys[:, :, :, i] = self.xys[:, :, :, i * self.DOWNSAMPLERATIO]
-                        elif self.nPoints > self.bufPoints:
-                            # Extend the buffer
-                            newLen = self.bufPoints * 2     # The new buffer length
-                            if newLen > self.maxPoints:
-                                newLen = self.maxPoints
-                            ext = np.empty((self.nrows, self.ncols, 2, newLen - self.bufPoints))
-                            self.xys = np.append(self.xys, ext, axis=3)
-                            if DEBUG_INFO:
-                                print ("Extended plotting buffer, {0} -> {1}".format(self.bufPoints, newLen))
-                            self.bufPoints = newLen
-                        # ____Store data
-                        k = self.nPoints - 1
-                        for i in range(self.nrows):
-                            for j in range(self.ncols):
-                                self.xys[i, j, 0, k] = x = dataPoint[i][j][0]
-                                self.xys[i, j, 1, k] = y = dataPoint[i][j][1]
-                                # Recalculating min's & max's
-                                xMin, xMax = self.xyLims[i, j, 0] 
-                                yMin, yMax = self.xyLims[i, j, 1] 
-                                
-                                xMin = min(x, xMin)
-                                xMax = max(x, xMax)
-                                yMin = min(y, yMin)
-                                yMax = max(y, yMax)
-                                
-                                self.xyLims[i, j, 0] = xMin, xMax
-                                self.xyLims[i, j, 1] = yMin, yMax
-                        self.flag_newData = True
+                        # a block of data points, dataPoint[i, j, k, :] for sub-plot(i, j)
+                        self.appendBlock(dataPoint)
                     else:
                         print("[WARNING: plot_live] Unrecognised command: {}\n".format(command))
+            # Collect everything written to the ring buffer since the last visit
+            if (self.ring is not None) and not self.flag_quit:
+                block, self.ringIndex = self.ring.read(self.ringIndex)
+                if block.shape[1] > 0:
+                    with self.dataLock:
+                        self.appendBlock(block[self.ringColumns])
             # Wait
             if not self.flag_quit:
                 time.sleep(self.listenInterval)
+        if self.ring is not None:
+            self.ring.close()
+    
+    # Append a block of data points, block[i, j, k, :] = x's (k=0) or y's (k=1) for sub-plot(i, j); the dataLock must be held
+    def appendBlock(self, block):
+        n = block.shape[3]
+        if n == 0:
+            return
+        # ____Update the extrema, ignoring nan's
+        with np.errstate(invalid="ignore"):
+            self.xyLims[:, :, :, 0] = np.fmin(self.xyLims[:, :, :, 0], np.fmin.reduce(block, axis=3))
+            self.xyLims[:, :, :, 1] = np.fmax(self.xyLims[:, :, :, 1], np.fmax.reduce(block, axis=3))
+        # ____Check buffer size
+        if self.nPoints + n > self.maxPoints:
+            # Down-sampling old data
+            if DEBUG_INFO:
+                print("[DEBUG: LivePlot] Plotting buffer full, down-sampling.")
+            kept = self.xys[:, :, :, 0:self.nPoints:self.DOWNSAMPLERATIO].copy()
+            self.nPoints = kept.shape[3]
+            self.xys[:, :, :, :self.nPoints] = kept
+            if self.nPoints + n > self.maxPoints:
+                # the block alone is too large, down-sample it as well
+                step = -(-n // (self.maxPoints - self.nPoints))
+                block = block[:, :, :, ::step]
+                n = block.shape[3]
+        while self.nPoints + n > self.bufPoints:
+            # Extend the buffer
+            newLen = min(self.bufPoints * 2, self.maxPoints)     # The new buffer length
+            ext = np.empty((self.nrows, self.ncols, 2, newLen - self.bufPoints))
+            self.xys = np.append(self.xys, ext, axis=3)
+            if DEBUG_INFO:
+                print ("Extended plotting buffer, {0} -> {1}".format(self.bufPoints, newLen))
+            self.bufPoints = newLen
+        # ____Store data
+        self.xys[:, :, :, self.nPoints:self.nPoints+n] = block
+        self.nPoints += n
+        self.flag_newData = True
     
     # Generator for animation
     def genCheckFlags(self):
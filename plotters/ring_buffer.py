@@ -0,0 +1,82 @@
+""" A columnar ring buffer in shared memory, to pass every data point from the measurements to the plotting process
+    One writer (the measurement thread) and any number of readers, each keeping its own read index
+"""
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory     # Python >= 3.8
+except ImportError:
+    shared_memory = None
+
+# Constants
+DEFAULT_CAPACITY = 2**16    # number of data points kept, per variable
+HEADER_BYTES = 64   # room in front of the data, the first 8 bytes hold the write index
+
+def available():
+    return shared_memory is not None
+
+class SharedRingBuffer:
+    """Float64 columns, one per variable in "names", holding the latest "capacity" data points
+    The write index counts every point ever written, and is only advanced after the point is complete"""
+    def __init__(self, names, capacity=DEFAULT_CAPACITY, shm_name=None):
+        # Create a new buffer if shm_name is None, otherwise attach to an existing one
+        if shared_memory is None:
+            raise Exception("[SharedRingBuffer] multiprocessing.shared_memory requires Python 3.8 or newer")
+        self.names = list(names)
+        self.capacity = capacity
+        size = HEADER_BYTES + len(self.names) * capacity * 8
+        if shm_name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=shm_name)
+            self.owner = False
+        self.index = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.data = np.ndarray((len(self.names), capacity), dtype=np.float64, buffer=self.shm.buf, offset=HEADER_BYTES)
+        if self.owner:
+            self.index[0] = 0
+            self.data.fill(np.nan)
+
+    # What a reader in another process needs to attach: SharedRingBuffer(*spec)
+    def spec(self):
+        return (self.names, self.capacity, self.shm.name)
+
+    def append(self, values):
+        """write one data point, values in the order of names"""
+        i = int(self.index[0])
+        self.data[:, i % self.capacity] = values
+        self.index[0] = i + 1   # publish
+
+    def write_index(self):
+        return int(self.index[0])
+
+    def read(self, start):
+        """copy out the points written since the write index "start"
+        returns (block, end), where block has the shape (len(names), n) and end is the index to read from next time
+        points already overwritten are skipped, so n may be less than end - start"""
+        end = int(self.index[0])
+        # the oldest slot may be under overwriting by the next point
+        start = max(start, end - self.capacity + 1)
+        n = end - start
+        if n <= 0:
+            return np.empty((len(self.names), 0)), end
+        i0 = start % self.capacity
+        i1 = i0 + n
+        if i1 <= self.capacity:
+            block = self.data[:, i0:i1].copy()
+        else:
+            block = np.concatenate((self.data[:, i0:], self.data[:, :i1 - self.capacity]), axis=1)
+        # The writer may have lapped us while copying: drop whatever got overwritten
+        lapped = int(self.index[0]) - self.capacity + 1 - start
+        if lapped > 0:
+            block = block[:, min(lapped, n):]
+        return block, end
+
+    def close(self):
+        self.index = None
+        self.data = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
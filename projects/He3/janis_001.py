@@ -4,7 +4,7 @@ import time
 import csv
 import numpy as np
 
-from elflab import uis, datasets
+from elflab import uis, datasets, kernels
 from elflab.devices.T_controllers.lakeshore import Lakeshore332
 from elflab.devices.T_controllers.cryocon import Cryocon32B
 
@@ -164,6 +164,8 @@ class Janis001He3TwoLockinAbstract(abstracts.ExperimentBase):
         self.R_series2 = float(params["R_series2 / Ohm"])
         self.magnet = magnet
         
+        self.timings = kernels.StageTimings()    # latency of each device read, shown by the "stats" command of the kernel
+        
         # Initialise variables
         self.current_values = VAR_INIT.copy()
         self.var_titles = VAR_TITLES.copy()
@@ -194,12 +196,16 @@ class Janis001He3TwoLockinAbstract(abstracts.ExperimentBase):
     def measure(self):
         self.current_values["n"] += 1
         self.current_values["t"] = self.t0 + time.perf_counter()
-        t,self.current_values["T_flow"] = self.cryocon.read("A")
-        t,self.current_values["T_sample"] = self.cryocon.read("B")
-        t,self.current_values["T_sorb"] = self.lakeshore.read("A")
-        t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
-        t,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = self.lockin1.read()
-        t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
+        with self.timings.timing("cryocon"):
+            t,(self.current_values["T_flow"], self.current_values["T_sample"]) = self.cryocon.read_many(("A", "B"))
+        with self.timings.timing("lakeshore"):
+            t,self.current_values["T_sorb"] = self.lakeshore.read("A")
+        with self.timings.timing("magnet"):
+            t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
+        with self.timings.timing("lockin1"):
+            t,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = self.lockin1.read()
+        with self.timings.timing("lockin2"):
+            t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
         self.current_values["R1"] = self.current_values["X1"] / self.current_values["Vex1"] * self.R_series1
         self.current_values["R2"] = self.current_values["X2"] / self.current_values["Vex2"] * self.R_series2
         
@@ -445,6 +451,8 @@ class Janis001Keithley617SR830(abstracts.ExperimentBase):
         self.R_series2 = float(params["Ch2 R_series / Ohm"])
         self.magnet = fake_magnets.ConstMagnet()
         
+        self.timings = kernels.StageTimings()    # latency of each device read, shown by the "stats" command of the kernel
+        
         # Initialise variables
         self.current_values = VAR_INIT.copy()
         self.var_titles = VAR_TITLES.copy()
@@ -475,12 +483,16 @@ class Janis001Keithley617SR830(abstracts.ExperimentBase):
     def measure(self):
         self.current_values["n"] += 1
         self.current_values["t"] = self.t0 + time.perf_counter()
-        t,self.current_values["T_flow"] = self.cryocon.read("A")
-        t,self.current_values["T_sample"] = self.cryocon.read("B")
-        t,self.current_values["T_sorb"] = self.lakeshore.read("A")
-        t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
-        t,self.current_values["R1"] = self.keithley617.read()
-        t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
+        with self.timings.timing("cryocon"):
+            t,(self.current_values["T_flow"], self.current_values["T_sample"]) = self.cryocon.read_many(("A", "B"))
+        with self.timings.timing("lakeshore"):
+            t,self.current_values["T_sorb"] = self.lakeshore.read("A")
+        with self.timings.timing("magnet"):
+            t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
+        with self.timings.timing("keithley617"):
+            t,self.current_values["R1"] = self.keithley617.read()
+        with self.timings.timing("lockin2"):
+            t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
         self.current_values["R2"] = self.current_values["X2"] / self.current_values["Vex2"] * self.R_series2
         
     def log(self, dataToLog):
@@ -561,6 +573,8 @@ class Janis001He3Gating(abstracts.ExperimentBase):
         
         self.vgate = hp.HP3478(GPIB_HPDMM)
         
+        self.timings = kernels.StageTimings()    # latency of each device read, shown by the "stats" command of the kernel
+        
         # Initialise variables
         self.current_values = VAR_INIT.copy()
         self.var_titles = VAR_TITLES.copy()
@@ -591,13 +605,18 @@ class Janis001He3Gating(abstracts.ExperimentBase):
     def measure(self):
         self.current_values["n"] += 1
         self.current_values["t"] = self.t0 + time.perf_counter()
-        t,self.current_values["T_flow"] = self.cryocon.read("A")
-        t,self.current_values["T_sample"] = self.cryocon.read("B")
-        t,self.current_values["T_sorb"] = self.lakeshore.read("A")
-        t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
-        t,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = self.lockin1.read()
-        t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
-        self.current_values["V_gate"] = self.vgate.read()[1]
+        with self.timings.timing("cryocon"):
+            t,(self.current_values["T_flow"], self.current_values["T_sample"]) = self.cryocon.read_many(("A", "B"))
+        with self.timings.timing("lakeshore"):
+            t,self.current_values["T_sorb"] = self.lakeshore.read("A")
+        with self.timings.timing("magnet"):
+            t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
+        with self.timings.timing("lockin1"):
+            t,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = self.lockin1.read()
+        with self.timings.timing("lockin2"):
+            t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
+        with self.timings.timing("vgate"):
+            self.current_values["V_gate"] = self.vgate.read()[1]
         self.current_values["R1"] = self.current_values["X1"] / self.current_values["Vex1"] * self.R_series1
         self.current_values["R2"] = self.current_values["X2"] / self.current_values["Vex2"] * self.R_series2
         
@@ -657,6 +676,8 @@ class Janis001He3GatingElectrometer(abstracts.ExperimentBase):
         
         self.vgate = hp.HP3478(GPIB_HPDMM)
         
+        self.timings = kernels.StageTimings()    # latency of each device read, shown by the "stats" command of the kernel
+        
         # Initialise variables
         self.current_values = VAR_INIT.copy()
         self.var_titles = VAR_TITLES.copy()
@@ -685,12 +706,16 @@ class Janis001He3GatingElectrometer(abstracts.ExperimentBase):
     def measure(self):
         self.current_values["n"] += 1
         self.current_values["t"] = self.t0 + time.perf_counter()
-        t,self.current_values["T_flow"] = self.cryocon.read("A")
-        t,self.current_values["T_sample"] = self.cryocon.read("B")
-        t,self.current_values["T_sorb"] = self.lakeshore.read("A")
-        t,self.current_values["R1"] = self.keithley617.read()
-        t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
-        self.current_values["V_gate"] = self.vgate.read()[1]
+        with self.timings.timing("cryocon"):
+            t,(self.current_values["T_flow"], self.current_values["T_sample"]) = self.cryocon.read_many(("A", "B"))
+        with self.timings.timing("lakeshore"):
+            t,self.current_values["T_sorb"] = self.lakeshore.read("A")
+        with self.timings.timing("keithley617"):
+            t,self.current_values["R1"] = self.keithley617.read()
+        with self.timings.timing("magnet"):
+            t,self.current_values["H"],self.current_values["I_magnet"] = self.magnet.read()
+        with self.timings.timing("vgate"):
+            self.current_values["V_gate"] = self.vgate.read()[1]
         
         
         
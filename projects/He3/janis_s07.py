@@ -10,8 +10,9 @@ import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from elflab import uis
+from elflab import uis, kernels
 from elflab.devices.T_controllers.lakeshore import Lakeshore340
+from elflab.devices.device_base import bus_lock
 
 import elflab.abstracts as abstracts
 import elflab.dataloggers.csvlogger as csvlogger
@@ -24,6 +25,9 @@ from elflab.devices.dmms import keithley
 SENS_RANGE = (0.1, 0.8)
 
 GPIB_LAKESHORE340 = 11
+
+# Rate groups for the two-lockin experiments, opt-in: lock-ins are the fast channels; temperatures and the field change slowly
+RATE_GROUPS = {"lockins": (1, "ticks"), "temperatures": (10, "ticks"), "magnet": (1., "s")}
 GPIB_DMM = 19
 
 
@@ -481,7 +485,7 @@ class JanisS07Controller(abstracts.ControllerBase):
     def __init__(self, kernel):
         self.kernel = kernel
         self.lakeshore = kernel.experiment.lakeshore
-        self.instrument_lock = kernel.instrument_lock
+        self.lakeshore_lock = bus_lock(self.lakeshore)  # everything here talks to the Lakeshore only
         self.data_lock = kernel.data_lock
         
         # sort stepping parameters for assisting sample ramping
@@ -494,19 +498,19 @@ class JanisS07Controller(abstracts.ControllerBase):
         # Initialise the assist thread
         self.assist_thread = threading.Thread(target=None)
         self.assist_thread.start()
+        self.assist_task = None     # the ramp assist as a periodic task, on kernels with an event loop
         
     # Read the status of the T_controller
     # returns (T1, SETP1, rampst1, Heater1, T2, SETP2, rampst2, HEATERs)
     def get_status(self):
         if self.kernel.flag_pause or self.kernel.flag_stop or self.kernel.flag_quit:
-            with self.instrument_lock:
-                T1 = self.lakeshore.read("C")[1]
-                T2 = self.lakeshore.read("A")[1]
+            with self.lakeshore_lock:
+                (T1, T2) = self.lakeshore.read_many(("C", "A"))[1]
         else:
             with self.data_lock:
                 T1 = self.kernel.current_values["T_sorb"]
                 T2 = self.kernel.current_values["T_A"]
-        with self.instrument_lock:
+        with self.lakeshore_lock:
             setp1 = self.lakeshore.get_setp(1)
             setp2 = self.lakeshore.get_setp(2)
             heater1 = self.lakeshore.get_heater(1)
@@ -516,14 +520,14 @@ class JanisS07Controller(abstracts.ControllerBase):
         return (T1, setp1, rampst1, heater1, T2, setp2, rampst2, heater2)
         
     def heater_off(self, loop):
-        with self.instrument_lock:
+        with self.lakeshore_lock:
             self.lakeshore.set_ramp(loop, 0, self.R_MIN)
             self.lakeshore.set_setp(loop, self.T_MIN)
             if loop == 1:
                 self.lakeshore.set_range(0)
     
     def step(self, loop, T):
-        with self.instrument_lock:
+        with self.lakeshore_lock:
             if loop == 1:
                 self.lakeshore.set_range(5)
             self.lakeshore.set_ramp(loop, 0, self.R_MIN)
@@ -533,27 +537,24 @@ class JanisS07Controller(abstracts.ControllerBase):
         if loop == 1:
             (T1, setp1, rampst1, heater1, T2, setp2, rampst2, heater2) = self.get_status()
             self.step(1, T1)
-            with self.instrument_lock:
+            with self.lakeshore_lock:
                 self.lakeshore.set_range(5)
                 self.lakeshore.set_ramp(1, 1, r)
                 self.lakeshore.set_setp(1, T)
         elif loop == 2:
             # stop the old assist thread
-            self.end_assist.set()
-            self.assist_thread.join(timeout=0.1)
+            self.stop_assist()
             # set ramping
             (T1, setp1, rampst1, heater1, T2, setp2, rampst2, heater2) = self.get_status()
             self.step(2, T2)
-            with self.instrument_lock:
+            with self.lakeshore_lock:
                 self.lakeshore.set_ramp(2, 1, r)
                 self.lakeshore.set_setp(2, T)
             # starting the assist thread
             if T > T2:
-                with self.instrument_lock:
+                with self.lakeshore_lock:
                     self.lakeshore.set_range(5)
-                self.end_assist.clear()
-                self.assist_thread = threading.Thread(target=self.ramp_assist)
-                self.assist_thread.start()
+                self.start_assist()
     
     # Change the parameters for ramping assist
     def set_assist(self, threshold, step, interval):
@@ -561,18 +562,42 @@ class JanisS07Controller(abstracts.ControllerBase):
         self.ramp_assist_interval = interval     # in second
         self.ramp_assist_step = step    # in Kelvin
         
+    # Run the ramp assist on the kernel's event loop if it has one, otherwise in a thread of its own
+    def start_assist(self):
+        self.end_assist.clear()
+        if hasattr(self.kernel, "run_periodic"):
+            self.assist_task = self.kernel.run_periodic(self.ramp_assist_interval, self.assist_once)
+            if self.assist_task is not None:
+                return
+        self.assist_thread = threading.Thread(target=self.ramp_assist)
+        self.assist_thread.start()
+    
+    def stop_assist(self):
+        self.end_assist.set()
+        if self.assist_task is not None:
+            self.assist_task.cancel()
+            self.assist_task = None
+        self.assist_thread.join(timeout=0.1)
+    
+    # One step of the ramp assist, returns False when done
+    def assist_once(self):
+        if self.end_assist.is_set():
+            return False
+        (T1, setp1, rampst1, heater1, T2, setp2, rampst2, heater2) = self.get_status()
+        if T1 >= self.ASSIST_MAX_T:
+            self.end_assist.set()
+            return False
+        elif heater2 > self.ramp_assist_threshold:
+            self.step(1, T1+self.ramp_assist_step)
+        return True
+    
     def ramp_assist(self):
         while not self.end_assist.wait(timeout=self.ramp_assist_interval):
-            #messagebox.showerror("debug", "r")
-            (T1, setp1, rampst1, heater1, T2, setp2, rampst2, heater2) = self.get_status()
-            if T1 >= self.ASSIST_MAX_T:
-                self.end_assist.set()
-            elif heater2 > self.ramp_assist_threshold:
-                self.step(1, T1+self.ramp_assist_step)
+            if not self.assist_once():
+                break
         
     def terminate(self):
-        self.end_assist.set()
-        self.assist_thread.join(timeout=0.1)
+        self.stop_assist()
                 
 class JanisS07TwoLockinAbstract(abstracts.ExperimentBase):
     # "Public" Variables
@@ -605,6 +630,12 @@ class JanisS07TwoLockinAbstract(abstracts.ExperimentBase):
             [("t", "T_sample"), ("t", "T_1K")]
             ]
     
+    # Everything is measured every tick unless rate groups are set, e.g. to RATE_GROUPS;
+    # the age of each group's values (in s) is then logged too, as "age_<group>"
+    rate_groups = None
+    bus_locking = True  # the read group locks each bus
+    group_reads = {"lockins": ("lockin1", "lockin2"), "temperatures": ("temperatures",), "magnet": ("magnet",)}     # keys in the read group
+    
     default_comments = ""
     def __init__(self, params, filename, lockin1, lockin2, magnet):
     
@@ -623,6 +654,15 @@ class JanisS07TwoLockinAbstract(abstracts.ExperimentBase):
         
         # Initialise variables
         self.current_values = VAR_INIT.copy()   # = {"name": "value"}
+        if self.rate_groups is not None:
+            self.var_order = self.var_order.copy()
+            self.var_titles = self.var_titles.copy()
+            self.format_strings = self.format_strings.copy()
+            for var in kernels.RateGroups.age_variables(self.rate_groups):
+                self.var_order.append(var)
+                self.var_titles[var] = "{} / s".format(var)
+                self.format_strings[var] = "{:.4g}"
+                self.current_values[var] = float("nan")
         # create a csv logger
         self.logger = csvlogger.Logger(filename, self.var_order, self.var_titles, self.format_strings)
         
@@ -634,6 +674,13 @@ class JanisS07TwoLockinAbstract(abstracts.ExperimentBase):
         self.lockin2.connect()
         self.magnet.connect()
         
+        # Declare the reads of a measurement, to be issued concurrently across interfaces
+        self.read_group = kernels.ReadGroup()
+        self.read_group.add("temperatures", self.lakeshore.read_many, ("A", "B", "C", "D"))   # T_A, T_B, T_sorb, T_1K
+        self.read_group.add("magnet", self.magnet.read)
+        self.read_group.add("lockin1", self.lockin1.read)
+        self.read_group.add("lockin2", self.lockin2.read)
+        
         # Reset counter and timer
         self.n = 0
         self.t0 = time.perf_counter()
@@ -652,21 +699,26 @@ class JanisS07TwoLockinAbstract(abstracts.ExperimentBase):
         return T
     
     def measure(self):
-        self.current_values["n"] += 1
-        t,self.current_values["T_A"] = self.lakeshore.read("A")
-        t,self.current_values["T_B"] = self.lakeshore.read("B")
-        t,self.current_values["T_sorb"] = self.lakeshore.read("C")
-        t,self.current_values["T_1K"] = self.lakeshore.read("D")
+        self.measure_groups(self.group_reads.keys())
         
-        self.current_values["t"] = t - self.t0
+    def measure_groups(self, groups):
+        self.current_values["n"] += 1
+        readings = self.read_group.read([key for group in groups for key in self.group_reads[group]])
+        t = time.perf_counter()
+        if "temperatures" in groups:
+            t,(self.current_values["T_A"], self.current_values["T_B"], self.current_values["T_sorb"], self.current_values["T_1K"]) = readings["temperatures"]
+            
+            self.current_values["T_sample"] = self.calc_Tsample(self.current_values["T_A"], self.current_values["T_B"])
         
-        self.current_values["T_sample"] = self.calc_Tsample(self.current_values["T_A"], self.current_values["T_B"])
+        if "magnet" in groups:
+            _,self.current_values["H"],_ = readings["magnet"]
+        if "lockins" in groups:
+            t,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = readings["lockin1"]
+            t,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = readings["lockin2"]
+            self.current_values["R1"] = self.current_values["X1"] / self.current_values["Vex1"] * self.R_series1
+            self.current_values["R2"] = self.current_values["X2"] / self.current_values["Vex2"] * self.R_series2
         
-        t,self.current_values["H"],t = self.magnet.read()
-        t,self.current_values["X1"],self.current_values["Y1"],t,t,self.current_values["f1"],self.current_values["Vex1"] = self.lockin1.read()
-        t,self.current_values["X2"],self.current_values["Y2"],t,t,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
-        self.current_values["R1"] = self.current_values["X1"] / self.current_values["Vex1"] * self.R_series1
-        self.current_values["R2"] = self.current_values["X2"] / self.current_values["Vex2"] * self.R_series2
+        self.current_values["t"] = t - self.t0
         
     def log(self, dataToLog):
         self.logger.log(dataToLog)
@@ -677,6 +729,7 @@ class JanisS07TwoLockinAbstract(abstracts.ExperimentBase):
             yield True
         
     def finish(self):
+        self.read_group.close()
         self.logger.finish()
         
     def loadfile(filename): 
@@ -784,6 +837,8 @@ class JanisS07Sagnac(JanisS07TwoLockinAbstract):
             [("t", "T_sample"), ("t", "H")]
             ]
     
+    rate_groups = None  # measure everything every tick
+    
     default_comments = ""
     
     # to calculate the Kerr angle from the first and the second harmonics, everything in SI
@@ -819,18 +874,16 @@ class JanisS07Sagnac(JanisS07TwoLockinAbstract):
         
     def measure(self):
         self.current_values["n"] += 1
-        t,self.current_values["T_A"] = self.lakeshore.read("A")
-        t,self.current_values["T_B"] = self.lakeshore.read("B")
-        t,self.current_values["T_sorb"] = self.lakeshore.read("C")
-        t,self.current_values["T_1K"] = self.lakeshore.read("D")
+        readings = self.read_group.read()
+        t,(self.current_values["T_A"], self.current_values["T_B"], self.current_values["T_sorb"], self.current_values["T_1K"]) = readings["temperatures"]
         
         self.current_values["t"] = t - self.t0
         
         self.current_values["T_sample"] = self.calc_Tsample(self.current_values["T_A"], self.current_values["T_B"])
         
-        t,self.current_values["H"],self.current_values["I_mag"] = self.magnet.read()
-        t,self.current_values["X1"],self.current_values["Y1"],_,_,_,_ = self.lockin1.read()
-        t,self.current_values["X2"],self.current_values["Y2"],_,_,_,_ = self.lockin2.read()
+        t,self.current_values["H"],self.current_values["I_mag"] = readings["magnet"]
+        t,self.current_values["X1"],self.current_values["Y1"],_,_,_,_ = readings["lockin1"]
+        t,self.current_values["X2"],self.current_values["Y2"],_,_,_,_ = readings["lockin2"]
         self.current_values["Kerr_angle"] = self.kerr(self.current_values["X1"], self.current_values["X2"])
         
 class JanisS07SagnacWithMagnet(JanisS07Sagnac):
@@ -4,7 +4,7 @@ import time
 import csv
 import numpy as np
 
-from elflab import uis, datasets
+from elflab import uis, datasets, kernels
 
 from elflab.devices.lockins import stanford
 from elflab.devices.thermometers.rtd import RTD
@@ -143,6 +143,8 @@ class MI_SR830_Abstract(abstracts.ExperimentBase):
         
         self.Rs_mi = float(params["MI R_series / Ohm"])
         
+        self.timings = kernels.StageTimings()    # latency of each device read, shown by the "stats" command of the kernel
+        
         # Initialise variables
         self.current_values = VAR_INIT.copy()
         self.var_titles = VAR_TITLES.copy()
@@ -165,9 +167,12 @@ class MI_SR830_Abstract(abstracts.ExperimentBase):
     def measure(self):
         self.current_values["n"] += 1
         self.current_values["t"] = self.t0 + time.perf_counter()
-        (self.current_values["t_therm"], self.current_values["T"], self.current_values["I_therm"], self.current_values["V_therm"]) = self.thermometer.read()
-        (self.current_values["t_mag"], self.current_values["H"], self.current_values["I_mag"]) = self.magnet.read()
-        (self.current_values["t_lockin"], self.current_values["X"], self.current_values["Y"], self.current_values["R"], self.current_values["theta"], self.current_values["f"], self.current_values["V_in"]) = self.mi_lockin.read()
+        with self.timings.timing("thermometer"):
+            (self.current_values["t_therm"], self.current_values["T"], self.current_values["I_therm"], self.current_values["V_therm"]) = self.thermometer.read()
+        with self.timings.timing("magnet"):
+            (self.current_values["t_mag"], self.current_values["H"], self.current_values["I_mag"]) = self.magnet.read()
+        with self.timings.timing("mi_lockin"):
+            (self.current_values["t_lockin"], self.current_values["X"], self.current_values["Y"], self.current_values["R"], self.current_values["theta"], self.current_values["f"], self.current_values["V_in"]) = self.mi_lockin.read()
         
     def log(self, dataToLog):
         self.logger.log(dataToLog)
@@ -3,7 +3,7 @@
 import time, csv, math
 import numpy as np
 
-from elflab import uis, datasets
+from elflab import uis, datasets, kernels
 import elflab.abstracts as abstracts
 import elflab.dataloggers.csvlogger as csvlogger
 
@@ -148,6 +148,8 @@ class Dil001TwoLockin(abstracts.ExperimentBase):
             [("T_sample", "R1"), ("T_sample", "R2")],
             ]
     
+    bus_locking = True  # the read group locks each bus
+    
     default_comments = ""
     
     def __init__(self, params, filename):    
@@ -194,6 +196,15 @@ class Dil001TwoLockin(abstracts.ExperimentBase):
         self.magnet_y.connect()
         self.magnet_z.connect()
         
+        # Declare the reads of a measurement, to be issued concurrently across interfaces
+        self.read_group = kernels.ReadGroup()
+        self.read_group.add("temperatures", self.leiden_tc.read_many_TR, (self.ch_cernox, self.ch_ruo, self.ch_cmn))
+        self.read_group.add("Hx", self.magnet_x.read)
+        self.read_group.add("Hy", self.magnet_y.read)
+        self.read_group.add("Hz", self.magnet_z.read)
+        self.read_group.add("lockin1", self.lockin1.read)
+        self.read_group.add("lockin2", self.lockin2.read)
+        
         # Reset counter and timer
         self.n = 0
         self.t0 = time.time() - time.perf_counter()
@@ -217,21 +228,19 @@ class Dil001TwoLockin(abstracts.ExperimentBase):
         self.current_values["n"] += 1
         self.current_values["t"] = self.t0 + time.perf_counter()
         
-        _,self.current_values["T_Cernox"],self.current_values["R_Cernox"] = self.leiden_tc.read(self.ch_cernox)
-        _,self.current_values["T_RuO"],self.current_values["R_RuO"] = self.leiden_tc.read(self.ch_ruo)
+        readings = self.read_group.read()
+        
+        _,(self.current_values["T_Cernox"], self.current_values["T_RuO"], self.current_values["T_CMN"]),(self.current_values["R_Cernox"], self.current_values["R_RuO"], self.current_values["L_CMN"]) = readings["temperatures"]
         
-        _,self.current_values["Hx"],_ = self.magnet_x.read()
-        _,self.current_values["Hy"],_ = self.magnet_y.read()
-        _,self.current_values["Hz"],_ = self.magnet_z.read()
+        _,self.current_values["Hx"],_ = readings["Hx"]
+        _,self.current_values["Hy"],_ = readings["Hy"]
+        _,self.current_values["Hz"],_ = readings["Hz"]
         
-        _,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = self.lockin1.read()
-        _,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = self.lockin2.read()
+        _,self.current_values["X1"],self.current_values["Y1"],_,_,self.current_values["f1"],self.current_values["Vex1"] = readings["lockin1"]
+        _,self.current_values["X2"],self.current_values["Y2"],_,_,self.current_values["f2"],self.current_values["Vex2"] = readings["lockin2"]
         self.current_values["R1"] = self.current_values["X1"] / self.current_values["Vex1"] * self.R_series1
         self.current_values["R2"] = self.current_values["X2"] / self.current_values["Vex2"] * self.R_series2
         
-        
-        _,self.current_values["T_CMN"],self.current_values["L_CMN"] = self.leiden_tc.read(self.ch_cmn)
-        
         self.calc_sample_temperature()
         
     def log(self, dataToLog):
@@ -243,6 +252,7 @@ class Dil001TwoLockin(abstracts.ExperimentBase):
             yield True
         
     def finish(self):
+        self.read_group.close()
         self.logger.finish()
         del self.leiden_tc
         del self.lockin1
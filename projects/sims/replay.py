@@ -0,0 +1,156 @@
+""" Replay of recorded data through the Galileo kernels: logger, plot transport, controllers...
+    for benchmarking and testing without any instrument
+        usage:  experiment = ReplayExperiment({"source file": "old.dat", "speed (0: as fast as possible)": "10"}, "replayed.dat")
+                kernel = kernels.HeadlessGalileo(experiment)
+    The kernel runs free (measurement_interval = 0), the pace is kept by the replay sequence itself
+"""
+import time
+import csv
+import math
+import numpy as np
+from elflab import abstracts, datasets
+from elflab.dataloggers import csvlogger, nologger
+
+# Constants
+DEFAULT_SPEED = 1.  # 1: real time, N: N times faster, 0: as fast as possible
+DEFAULT_TIME_VAR = "t"
+DEFAULT_FORMAT = "{:.10g}"
+RESYNC_LAG = 0.5    # if the replay falls behind by more than this (in s, e.g. after a pause), restart the clock instead of rushing
+
+
+class ReplayExperiment(abstracts.ExperimentWithLogger):
+    """Feeds a recorded csvlogger file, or a DataSet, through a kernel one data point per measurement
+    A csvlogger file holds the variable titles in its header row: unless var_order is given, the variables are named
+    by var_titles mapped back from the titles (e.g. the VAR_TITLES of the experiment that recorded it), otherwise by the titles
+    The time variable is given by its name or its title, or by the symbol its title starts with (e.g. "t" for "t / s")"""
+    title = "Replay"
+
+    default_params = {
+        "source file": "",
+        "speed (0: as fast as possible)": "{:g}".format(DEFAULT_SPEED),
+        "time variable": DEFAULT_TIME_VAR,
+        "repeat": "0"
+    }
+    param_order = [
+        "source file",
+        "speed (0: as fast as possible)",
+        "time variable",
+        "repeat"
+    ]
+
+    def __init__(self, params, filename=None, dataset=None, var_order=None, var_titles=None, format_strings=None, plotXYs=None):
+                # (self, parameters, file to log into (None: no logging), DataSet to replay instead of the source file, ...)
+        self.speed = float(params.get("speed (0: as fast as possible)", DEFAULT_SPEED))
+        self.time_var = params.get("time variable", DEFAULT_TIME_VAR)
+        self.repeat = int(params.get("repeat", 0))   # number of extra passes through the data
+        self.measurement_interval = 0.
+
+        # Load the data
+        if dataset is None:
+            dataset = load_recording(params["source file"], var_order, var_titles)
+        self.dataset = dataset
+        self.var_order = list(var_order) if var_order is not None else list(dataset.keys())
+        self.time_var = find_var(dataset, self.time_var)
+
+        if var_titles is None:
+            var_titles = {}
+        self.var_titles = {var: var_titles.get(var, dataset.titles.get(var, var)) for var in self.var_order}
+        if format_strings is None:
+            format_strings = {var: DEFAULT_FORMAT for var in self.var_order}
+        self.format_strings = format_strings
+        if plotXYs is None:
+            others = [var for var in self.var_order if var != self.time_var]
+            plotXYs = [[(self.time_var, var)] for var in others[:2]] if len(others) > 0 else [[(self.time_var, self.time_var)]]
+        self.plotXYs = plotXYs
+
+        # Replayed data, as lists for fast indexing
+        self.columns = {var: dataset[var].tolist() for var in self.var_order}
+        self.length = len(self.columns[self.time_var])
+        self.current_values = {var: float("nan") for var in self.var_order}
+
+        if filename is None:
+            self.logger = nologger.Logger()
+        else:
+            self.logger = csvlogger.Logger(filename, self.var_order, self.var_titles, self.format_strings)
+
+    def start(self):
+        self.logger.start()
+        self.index = 0
+        self.n_replayed = 0
+        self.t_start = time.perf_counter()
+
+    def sequence(self):
+        times = self.columns[self.time_var]
+        for n_pass in range(self.repeat + 1):
+            t0 = None   # recorded time of the first data point
+            clock0 = time.perf_counter()
+            for i in range(self.length):
+                self.index = i
+                if self.speed > 0:
+                    t = times[i]
+                    if not math.isnan(t):
+                        if t0 is None:
+                            t0 = t
+                        delay = clock0 + (t - t0) / self.speed - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        elif delay < -RESYNC_LAG:
+                            clock0 -= delay
+                yield True
+
+    def measure(self):
+        i = self.index
+        for var in self.var_order:
+            self.current_values[var] = self.columns[var][i]
+        self.n_replayed += 1
+
+    def rate(self):     # data points replayed per second
+        elapsed = time.perf_counter() - self.t_start
+        return self.n_replayed / elapsed if elapsed > 0 else float("nan")
+
+    def report(self):
+        return "{:d} data points replayed in {:.4g} s: {:.4g} samples/s (speed: {})".format(
+                self.n_replayed, time.perf_counter() - self.t_start, self.rate(),
+                "x{:g}".format(self.speed) if self.speed > 0 else "as fast as possible")
+
+    def finish(self):
+        self.logger.finish()
+        print("    [Replay:] {}".format(self.report()))
+
+
+def find_var(dataset, var):
+    """the name of the variable var of the dataset: var itself, the variable titled var,
+    or the variable whose title starts with the symbol var (e.g. "t / s" for "t")"""
+    if var in dataset:
+        return var
+    titles = dataset.titles if dataset.titles is not None else {}
+    for match in (lambda title: title == var, lambda title: title.split("/")[0].split("(")[0].strip() == var):
+        names = [key for key in dataset if match(titles.get(key, key))]
+        if len(names) > 0:
+            return names[0]
+    raise ValueError("[ReplayExperiment] variable \"{}\" not found in the data: {}".format(var, list(dataset.keys())))
+
+def load_recording(filepath, var_order=None, var_titles=None):
+    """load a file written by csvlogger, as a DataSet
+    variables are named by var_order if given, otherwise by the titles in the header row,
+    mapped back to the short names by var_titles = {name: title} where they match
+    the header rows repeated in a file appended to are skipped"""
+    with open(filepath, "r", newline='') as f:
+        header = next(csv.reader(f))
+    if var_order is None:
+        names = {title: var for (var, title) in var_titles.items()} if var_titles is not None else {}
+        var_order = [names.get(title, title) for title in header]
+    elif len(var_order) != len(header):
+        raise ValueError("[load_recording] {:d} variables given for {:d} columns".format(len(var_order), len(header)))
+    column_mapping = {}
+    for (i, var) in enumerate(var_order):
+        if var not in column_mapping.values():     # a repeated column is read once
+            column_mapping[i] = var
+    dataset = datasets.load_csv(filepath, column_mapping)
+    # a file appended to holds a header row per session, read as a row of NaN: drop the rows without any value
+    empty = np.all(np.isnan(np.array([dataset[var] for var in dataset])), axis=0)
+    if np.any(empty):
+        titles = dataset.titles
+        dataset = dataset.mask(~empty)
+        dataset.titles = titles
+    return dataset
@@ -26,6 +26,7 @@ class Text:
                     "autoscale on": self.kernel.autoscaleOn, "+a": self.kernel.autoscaleOn,
                     "autoscale off": self.kernel.autoscaleOff, "-a": self.kernel.autoscaleOff,
                     "clear plot": self.kernel.clearPlot,
+                    "stats": self.kernel.showStats,
                     "": self.kernel.prompt
                     }
         